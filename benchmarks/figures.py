@@ -0,0 +1,70 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+from modules.batch import batch_market
+from modules.book import Schedule
+from modules.config import Config
+import modules.render as render
+
+# Figures per second for the sessions of a batch run of the Fig 3 market:
+# drawing each one with pyplot like `graphs` does (a new figure every time),
+# with one reused `render.FigureRenderer` and with the renderer on a pool
+
+
+def fig3_jobs(sessions: int, directory: str, fmt: str) -> list[dict]:
+    config = Config.from_toml(os.path.join(ROOT, 'config.toml'))
+    half = config.num_traders // 2
+    values = np.array([config.redemption_values] * half + [config.costs] * half)
+    schedule = Schedule.from_arrays(values, np.arange(2 * half) < half, True, config.min_price, config.max_price)
+    result = batch_market(schedule, sessions, periods=config.periods, max_steps=config.max_steps, seed=0)
+    return render.batch_jobs(schedule, result, directory, fmt=fmt)
+
+
+def pyplot_figures(jobs: list[dict]):
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import modules.graphs as graphs
+
+    for job in jobs:
+        fig = plt.figure(constrained_layout=True)
+        ax1, ax2 = fig.subplots(nrows=1, ncols=2, width_ratios=[1, 2])
+        costs, redemptions = job['costs'].tolist(), job['redemptions'].tolist()
+        graphs.plot_supply_demand(costs, redemptions, job['min_price'], job['max_price'], ax=ax1)
+        offsets = job['offsets']
+        prices = [job['prices'][offsets[p]:offsets[p+1]].tolist() for p in range(len(offsets) - 1)]
+        graphs.plot_transactions(prices, graphs.find_equilibrium(costs, redemptions)[1], job['min_price'], job['max_price'], ax=ax2)
+        fig.savefig(job['path'])
+        plt.close(fig)
+
+
+def rate(run, jobs: list[dict]) -> float:
+    start = time.perf_counter()
+    run(jobs)
+    return len(jobs) / (time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Figures per second for batch rendering")
+    parser.add_argument('--sessions', type=int, default=200)
+    parser.add_argument('--format', choices=render.FORMATS, default='png')
+    parser.add_argument('--workers', type=int, default=0, help="0 for all cores")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        jobs = fig3_jobs(args.sessions, directory, args.format)
+        results = {
+            "pyplot, new figure each": rate(pyplot_figures, jobs),
+            "renderer, 1 process": rate(lambda jobs: render.render_figures(jobs, workers=1), jobs),
+            f"renderer, {args.workers or os.cpu_count()} processes": rate(lambda jobs: render.render_figures(jobs, workers=args.workers), jobs),
+        }
+
+    for name, figures_per_second in results.items():
+        print(f"{name:>28}: {figures_per_second:8.1f} figures/s")
@@ -0,0 +1,43 @@
+import os
+import statistics
+import subprocess
+import sys
+
+# Import-time budget for the simulation path (config + market), in
+# milliseconds, not counting starting the interpreter itself. Most of it is
+# NumPy. Matplotlib must not get imported at all
+BUDGET_MS = 250
+MODULES = ['modules.config', 'modules.market']
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CODE = f"""
+import sys, time
+start = time.perf_counter()
+for name in {MODULES!r}:
+    __import__(name)
+print((time.perf_counter() - start) * 1000, 'matplotlib' in sys.modules)
+"""
+
+
+# Imports the simulation path in `runs` fresh interpreters, returns the
+# import time of each one in milliseconds and whether matplotlib got loaded
+def measure(runs: int = 10) -> tuple[list[float], bool]:
+    times = []
+    matplotlib_loaded = False
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, '-c', CODE], cwd=ROOT, capture_output=True, text=True, check=True).stdout.split()
+        times.append(float(out[0]))
+        matplotlib_loaded |= out[1] == 'True'
+    return times, matplotlib_loaded
+
+
+if __name__ == '__main__':
+    times, matplotlib_loaded = measure()
+    median = statistics.median(times)
+    print(f"Import time of {', '.join(MODULES)}: median {median:.1f} ms, min {min(times):.1f} ms (budget {BUDGET_MS} ms)")
+
+    if matplotlib_loaded:
+        sys.exit("matplotlib got imported by the simulation path")
+    if median > BUDGET_MS:
+        sys.exit(f"Over the import-time budget by {median - BUDGET_MS:.1f} ms")
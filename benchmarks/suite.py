@@ -0,0 +1,302 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+import modules.analytics as analytics
+import modules.market as market
+from modules.batch import batch_market
+from modules.book import Schedule
+from modules.config import Config
+from modules.ledger import OUT_OF_STEPS, MemoryLedger
+from modules.orderbook import cda_market
+import startup
+
+# Scaling curves of the market engines around a base market. Every case runs
+# with a fixed seed and a fixed step budget per period (and no timeout), so
+# the same case always does exactly the same work and only the speed depends
+# on the machine. `draws` and `trades` are recorded too, if they change
+# between two runs of the suite the engine itself changed
+SEED = 12345
+BASE = {'num_traders': 10, 'num_commodities': 10}
+NUM_TRADERS = [2, 10, 100, 1_000, 10_000]
+NUM_COMMODITIES = [1, 10, 100, 1_000]
+# Fig 3 of Gode & Sunder, every bidder/seller gets these
+FIG3_COSTS = (90, 90, 90, 95, 95, 95, 100, 100, 100)
+FIG3_REDEMPTIONS = (135, 135, 135, 95, 95, 95, 90, 90, 90)
+# The batch engine runs as many sessions as fit in this many values and this
+# many traders (every lockstep step looks at every trader of every session)
+BATCH_VALUES = 1_000_000
+BATCH_TRADERS = 20_000
+MAX_BATCH_SESSIONS = 200
+
+# Whether a bigger number is better, for the comparison
+HIGHER_IS_BETTER = {
+    'draws_per_s': True,
+    'events_per_s': True,
+    'trades_per_s': True,
+    'sessions_per_s': True,
+    'figures_per_s': True,
+    'seconds': False,
+    'peak_bytes': False,
+    'gen_traders_s': False,
+    'equilibrium_s': False,
+    'startup_ms': False,
+}
+
+
+# Every case as config settings plus a name: traders and commodities each
+# varied on their own around `BASE`, for both constraints, with random
+# schedules and with everyone on the Fig 3 schedule (which has a fixed number
+# of commodities)
+def cases(quick: bool = False) -> list[tuple[str, dict]]:
+    num_traders = [n for n in NUM_TRADERS if not quick or n <= 1_000]
+    num_commodities = [c for c in NUM_COMMODITIES if not quick or c <= 100]
+
+    found = []
+    for constrained in (True, False):
+        points = [dict(BASE, num_traders=n, schedules='random') for n in num_traders]
+        points += [dict(BASE, num_commodities=c, schedules='random') for c in num_commodities]
+        points += [dict(BASE, num_traders=n, num_commodities=len(FIG3_COSTS), schedules='explicit') for n in num_traders]
+        for point in points:
+            settings = dict(point, constrained=constrained)
+            name = f"{settings['schedules']}-{'zic' if constrained else 'ziu'}-t{settings['num_traders']}-c{settings['num_commodities']}"
+            if name not in [n for n, _ in found]:
+                found.append((name, settings))
+    return found
+
+
+def case_config(settings: dict, periods: int, max_steps: int) -> Config:
+    explicit = settings['schedules'] == 'explicit'
+    return Config(
+        num_traders=settings['num_traders'],
+        num_commodities=settings['num_commodities'],
+        constrained=settings['constrained'],
+        costs=FIG3_COSTS if explicit else None,
+        redemption_values=FIG3_REDEMPTIONS if explicit else None,
+        periods=periods,
+        max_steps=max_steps,
+        timeout=0,
+        random_seed=SEED,
+    )
+
+
+# Draws made in every period of a ledger, a period that didn't run out of
+# steps ended right after its last trade
+def ledger_draws(ledger: MemoryLedger, max_steps: int) -> int:
+    offsets = ledger.period_offsets()
+    draws = 0
+    for p, reason in enumerate(ledger.reasons):
+        if reason == OUT_OF_STEPS:
+            draws += max_steps
+        elif offsets[p+1] > offsets[p]:
+            draws += int(ledger.step[offsets[p+1] - 1])
+    return draws
+
+
+# Runs `run()` once for the time and once more under tracemalloc for the peak
+# memory it allocated (tracemalloc slows things down too much to time with it)
+def timed(run) -> tuple[float, object, int]:
+    start = time.perf_counter()
+    result = run()
+    seconds = time.perf_counter() - start
+
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, result, peak
+
+
+def bench_reference(config: Config) -> dict:
+    start = time.perf_counter()
+    traders = market.gen_traders(config)
+    gen_traders_s = time.perf_counter() - start
+
+    costs = tuple(c for t in traders if not t.is_bidder for c in t.redemptions_or_costs)
+    redemptions = tuple(r for t in traders if t.is_bidder for r in t.redemptions_or_costs)
+    start = time.perf_counter()
+    # Past the cache, so it's the real work every time
+    analytics.equilibrium_of.__wrapped__(costs, redemptions)
+    equilibrium_s = time.perf_counter() - start
+
+    def run():
+        ledger = MemoryLedger()
+        market.market(traders, config, seed=SEED, ledgers=(ledger,))
+        return ledger
+
+    seconds, ledger, peak = timed(run)
+    draws = ledger_draws(ledger, config.max_steps)
+    return {
+        'draws': draws,
+        'trades': len(ledger),
+        'seconds': seconds,
+        'draws_per_s': draws / seconds,
+        'trades_per_s': len(ledger) / seconds,
+        'peak_bytes': peak,
+        'gen_traders_s': gen_traders_s,
+        'equilibrium_s': equilibrium_s,
+    }
+
+
+# The continuous double auction, where every draw is an order event
+def bench_cda(config: Config) -> dict:
+    traders = market.gen_traders(config)
+
+    def run():
+        ledger = MemoryLedger()
+        cda_market(traders, config, seed=SEED, ledgers=(ledger,))
+        return ledger
+
+    seconds, ledger, peak = timed(run)
+    events = ledger_draws(ledger, config.max_steps)
+    return {
+        'draws': events,
+        'trades': len(ledger),
+        'seconds': seconds,
+        'events_per_s': events / seconds,
+        'trades_per_s': len(ledger) / seconds,
+        'peak_bytes': peak,
+    }
+
+
+def bench_batch(config: Config) -> dict:
+    half = config.num_traders // 2
+    sessions = max(1, min(MAX_BATCH_SESSIONS, BATCH_VALUES // (config.num_traders * config.num_commodities), BATCH_TRADERS // config.num_traders))
+    rng = np.random.default_rng(SEED)
+    if config.costs != None:
+        values = np.array([config.redemption_values] * half + [config.costs] * half)
+        session_values = None
+    else:
+        session_values = rng.integers(config.min_price, config.max_price + 1, size=(sessions, 2*half, config.num_commodities))
+        session_values.sort(axis=2)
+        session_values[:, :half] = session_values[:, :half, ::-1]
+        values = session_values[0]
+    schedule = Schedule.from_arrays(values, np.arange(2*half) < half, config.constrained, config.min_price, config.max_price)
+
+    run = lambda: batch_market(schedule, sessions, config.periods, config.max_steps, seed=SEED, values=session_values)
+    seconds, result, peak = timed(run)
+    draws = int(result.draws.sum())
+    trades = len(result.prices)
+    return {
+        'sessions': sessions,
+        'draws': draws,
+        'trades': trades,
+        'seconds': seconds,
+        'sessions_per_s': sessions / seconds,
+        'draws_per_s': draws / seconds,
+        'trades_per_s': trades / seconds,
+        'peak_bytes': peak,
+    }
+
+
+def bench_figures(figures: int = 20) -> float:
+    import tempfile
+    import figures as figure_benchmark
+    import modules.render as render
+
+    with tempfile.TemporaryDirectory() as directory:
+        jobs = figure_benchmark.fig3_jobs(figures, directory, 'png')
+        start = time.perf_counter()
+        render.render_figures(jobs, workers=1)
+        return figures / (time.perf_counter() - start)
+
+
+def run_suite(quick: bool = False, periods: int = 2, max_steps: int = 10_000, log=print) -> dict:
+    results = {
+        'machine': {
+            'platform': platform.platform(),
+            'processor': platform.processor(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'cpus': os.cpu_count(),
+        },
+        'settings': {'seed': SEED, 'periods': periods, 'max_steps': max_steps, 'quick': quick},
+        'startup_ms': float(np.median(startup.measure(5)[0])),
+        'figures_per_s': bench_figures(),
+        'cases': {},
+    }
+    for name, settings in cases(quick):
+        config = case_config(settings, periods, max_steps)
+        results['cases'][name] = {
+            'settings': settings,
+            'reference': bench_reference(config),
+            'batch': bench_batch(config),
+            'cda': bench_cda(config),
+        }
+        reference, batch, cda = (results['cases'][name][engine] for engine in ('reference', 'batch', 'cda'))
+        log(f"{name:>28}: reference {reference['draws_per_s']:12,.0f} draws/s {reference['trades_per_s']:10,.0f} trades/s, "
+            f"batch {batch['sessions_per_s']:9,.1f} sessions/s {batch['draws_per_s']:14,.0f} draws/s, "
+            f"cda {cda['events_per_s']:12,.0f} events/s")
+    return results
+
+
+# Every metric of a results file as {"case/engine/metric": value}
+def flatten(results: dict) -> dict:
+    flat = {key: results[key] for key in ('startup_ms', 'figures_per_s') if key in results}
+    for name, case in results.get('cases', {}).items():
+        for engine in ('reference', 'batch', 'cda'):
+            for metric, value in case.get(engine, {}).items():
+                flat[f"{name}/{engine}/{metric}"] = value
+    return flat
+
+
+# Metrics that got worse than `tolerance` (a fraction) against the baseline,
+# plus the cases whose amount of work changed (draws or trades), which means
+# the engine behaves differently and the speeds can't be compared
+def compare(results: dict, baseline: dict, tolerance: float = 0.25) -> tuple[list[str], list[str]]:
+    if results['settings'] != baseline['settings']:
+        raise ValueError(f"Can only compare runs with the same settings, got {results['settings']} and {baseline['settings']}")
+    current, before = flatten(results), flatten(baseline)
+    regressions, changed = [], []
+    for key, old in before.items():
+        if key not in current:
+            continue
+        new = current[key]
+        metric = key.rsplit('/', 1)[-1]
+        if metric in ('draws', 'trades', 'sessions'):
+            if new != old:
+                changed.append(f"{key}: {old} -> {new}")
+            continue
+        if metric not in HIGHER_IS_BETTER or old == 0:
+            continue
+        change = new / old - 1
+        worse = -change if HIGHER_IS_BETTER[metric] else change
+        if worse > tolerance:
+            regressions.append(f"{key}: {old:,.6g} -> {new:,.6g} ({change:+.1%})")
+    return regressions, changed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Scaling benchmarks for the market engines")
+    parser.add_argument('--out', default='benchmark.json', help="Where to write the results")
+    parser.add_argument('--compare', metavar='BASELINE', help="Results file to flag regressions against")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="How much worse (as a fraction) counts as a regression")
+    parser.add_argument('--quick', action='store_true', help="Leave out the biggest markets")
+    parser.add_argument('--periods', type=int, default=2)
+    parser.add_argument('--max-steps', type=int, default=10_000, help="Offer draws per period")
+    args = parser.parse_args()
+
+    results = run_suite(args.quick, args.periods, args.max_steps)
+    with open(args.out, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Startup {results['startup_ms']:.1f} ms, {results['figures_per_s']:.1f} figures/s, results in {args.out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions, changed = compare(results, baseline, args.tolerance)
+        for line in changed:
+            print(f"Work changed {line}")
+        for line in regressions:
+            print(f"Regression {line}")
+        if regressions:
+            sys.exit(f"{len(regressions)} regressions against {args.compare}")
+        print(f"No regressions against {args.compare}")
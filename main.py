@@ -1,30 +1,43 @@
-import modules.config as config
-import modules.market as market
-import modules.graphs as graphs
-import random
+import sys
+from modules.config import Config
+from modules.cache import ResultCache, cached_market
+from modules.ledger import LedgerWriter
 
-random.seed(config.random_seed)
+# Under this guard since `market()` can run the periods on a process pool,
+# which re-imports this file in every worker when it spawns them (the
+# default on Windows and macOS)
+if __name__ == '__main__':
+    config = Config.from_toml('config.toml')
+    # Traders with strategies don't have an opposite constraint to compare with
+    if config.graphs == 4 and config.strategies:
+        sys.exit("graphs = 4 compares ZI traders with and without the budget constraint, use 1, 2 or 3 with strategies")
+    cache = ResultCache.from_config(config)
 
-traders = market.gen_traders(config.constrained)
-transaction_prices = market.market(traders, timeout=config.timeout, periods=config.periods, quiet=config.quiet)
+    ledgers = (LedgerWriter(config.ledger),) if config.ledger else ()
+    traders, ledger = cached_market(config, cache=cache, ledgers=ledgers)
+    transaction_prices = ledger.transaction_prices()
 
-# Checks which graphs to plot based off of config.graphs
-if config.graphs == 1:
-    costs, redemptions = graphs.values_from_traders(traders)
-    graphs.plot_supply_demand(costs, redemptions, min_price=config.min_price, max_price=config.max_price)
-if config.graphs == 2:
-    costs, redemptions = graphs.values_from_traders(traders)
-    equilibrium_price = graphs.find_equilibrium(costs, redemptions)[1]
-    graphs.plot_transactions(transaction_prices, equilibrium_price=equilibrium_price, min_price=config.min_price, max_price=config.max_price)
-if config.graphs == 3:
-    costs, redemptions = graphs.values_from_traders(traders)
-    graphs.plot_supply_demand_and_transactions(list_of_traders=traders, prices=transaction_prices, min_price=config.min_price, max_price=config.max_price)
-if config.graphs == 4:
-    random.seed(config.random_seed)
+    # Matplotlib is slow to import, so only bring it in when there's something to plot
+    if config.graphs != 0:
+        import modules.graphs as graphs
 
-    traders = market.gen_traders(not config.constrained)
-    costs, redemptions = graphs.values_from_traders(traders)
-    graphs.big_graph(list_of_traders=traders, prices=transaction_prices, min_price=config.min_price, max_price=config.max_price)
+    # Checks which graphs to plot based off of config.graphs
+    if config.graphs == 1:
+        costs, redemptions = graphs.values_from_traders(traders)
+        graphs.plot_supply_demand(costs, redemptions, min_price=config.min_price, max_price=config.max_price)
+    if config.graphs == 2:
+        costs, redemptions = graphs.values_from_traders(traders)
+        equilibrium_price = graphs.find_equilibrium(costs, redemptions)[1]
+        graphs.plot_transactions(transaction_prices, equilibrium_price=equilibrium_price, min_price=config.min_price, max_price=config.max_price)
+    if config.graphs == 3:
+        costs, redemptions = graphs.values_from_traders(traders)
+        graphs.plot_supply_demand_and_transactions(list_of_traders=traders, prices=transaction_prices, min_price=config.min_price, max_price=config.max_price)
+    if config.graphs == 4:
+        # Same traders with the opposite constraint, only simulated the first time
+        other_traders, other_ledger = cached_market(config, not config.constrained, cache=cache)
+        graphs.big_graph(list_of_traders=traders, prices=transaction_prices,
+                         other_traders=other_traders, other_prices=other_ledger.transaction_prices(),
+                         min_price=config.min_price, max_price=config.max_price)
 
 
 ##################################  Example  ##################################
@@ -45,7 +58,7 @@ if config.graphs == 4:
 #
 #traders = [b1, s1]
 #
-#transaction_prices = market(traders, timeout=1, periods=3, quiet = False)
+#transaction_prices = market(traders, Config(periods=3, quiet=False))
 #print(f"{transaction_prices=}")
 #
 ## Graphs
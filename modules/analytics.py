@@ -0,0 +1,159 @@
+from dataclasses import dataclass
+from functools import lru_cache
+import numpy as np
+
+# Everything here works on one session or a batch of them at once: schedules
+# are (..., units) arrays where the leading axes are sessions, and no function
+# loops over transactions in Python
+
+
+# Demand (redemption values, highest first) and supply (costs, lowest first)
+# schedules out of a (..., traders, units) matrix of values
+def schedules(values: np.ndarray, is_bidder: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    values = np.asarray(values)
+    is_bidder = np.asarray(is_bidder, dtype=bool)
+    lead = values.shape[:-2]
+    demand = -np.sort(-values[..., is_bidder, :].reshape(lead + (-1,)), axis=-1)
+    supply = np.sort(values[..., ~is_bidder, :].reshape(lead + (-1,)), axis=-1)
+    return demand, supply
+
+
+# Competitive equilibrium of sorted schedules. Returns the quantity (the most
+# units that can trade without anyone losing money) and the lowest and highest
+# price that clears the market, prices are NaN when nothing can trade
+def equilibrium(demand: np.ndarray, supply: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    demand = np.asarray(demand, dtype=np.float64)
+    supply = np.asarray(supply, dtype=np.float64)
+    units = min(demand.shape[-1], supply.shape[-1])
+    # Pad with a unit nobody wants so there's always a first unit that doesn't trade
+    demand = np.concatenate([demand[..., :units], np.full(demand.shape[:-1] + (1,), -np.inf)], axis=-1)
+    supply = np.concatenate([supply[..., :units], np.full(supply.shape[:-1] + (1,), np.inf)], axis=-1)
+
+    quantity = (demand >= supply).sum(axis=-1)
+    last = np.maximum(quantity - 1, 0)[..., None]
+    first_out = quantity[..., None]
+    low = np.maximum(np.take_along_axis(supply, last, -1), np.take_along_axis(demand, first_out, -1))[..., 0]
+    high = np.minimum(np.take_along_axis(demand, last, -1), np.take_along_axis(supply, first_out, -1))[..., 0]
+
+    traded = quantity > 0
+    return quantity, np.where(traded, low, np.nan), np.where(traded, high, np.nan)
+
+
+# Same thing for plain lists, cached so plotting the same schedules again
+# doesn't redo it
+@lru_cache(maxsize=256)
+def equilibrium_of(costs: tuple, redemptions: tuple) -> tuple[int, float|None, float|None]:
+    demand = np.sort(np.array(redemptions, dtype=np.float64))[::-1]
+    supply = np.sort(np.array(costs, dtype=np.float64))
+    quantity, low, high = equilibrium(demand, supply)
+    if quantity == 0:
+        return (0, None, None)
+    return (int(quantity), float(low), float(high))
+
+
+# Most total profit the traders could make: the highest redemption values
+# matched to the cheapest costs for as long as that still makes money
+def max_surplus(demand: np.ndarray, supply: np.ndarray) -> np.ndarray:
+    units = min(demand.shape[-1], supply.shape[-1])
+    return np.maximum(demand[..., :units] - supply[..., :units], 0).sum(axis=-1)
+
+
+# Sums `x` over consecutive segments, offsets[..., s]:offsets[..., s+1] is
+# segment s (offsets are absolute positions in `x`)
+def segment_sums(x: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    x = np.asarray(x, dtype=np.float64)
+    cumulative = np.concatenate([[0.0], np.cumsum(x)])
+    return cumulative[offsets[..., 1:]] - cumulative[offsets[..., :-1]]
+
+
+# Root mean squared deviation of the prices of every segment from that
+# segment's equilibrium price (or anything that broadcasts to one per
+# segment), NaN for segments without trades. Segments have to follow each
+# other like they do in a ledger or a `BatchResult`
+def rms_deviation(prices: np.ndarray, offsets: np.ndarray, equilibrium_price) -> np.ndarray:
+    counts = np.diff(offsets, axis=-1)
+    eq = np.broadcast_to(np.asarray(equilibrium_price, dtype=np.float64), counts.shape)
+    covered = slice(offsets.min(), offsets.max())
+
+    squared = np.zeros(len(prices))
+    squared[covered] = (np.asarray(prices[covered], dtype=np.float64) - np.repeat(eq.ravel(), counts.ravel()))**2
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.sqrt(segment_sums(squared, offsets) / counts)
+
+
+# Smith's convergence coefficient: RMS deviation as a percentage of the
+# equilibrium price
+def smiths_alpha(rms: np.ndarray, equilibrium_price) -> np.ndarray:
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return 100 * rms / np.asarray(equilibrium_price, dtype=np.float64)
+
+
+@dataclass
+class MarketStats:
+    equilibrium_quantity: np.ndarray
+    # Range of prices that clear the market and its middle
+    equilibrium_low: np.ndarray
+    equilibrium_high: np.ndarray
+    equilibrium_price: np.ndarray
+    max_surplus: np.ndarray
+    # The rest are per period (sessions x periods for a batch)
+    trades: np.ndarray
+    realized_surplus: np.ndarray
+    efficiency: np.ndarray
+    rms_deviation: np.ndarray
+    smiths_alpha: np.ndarray
+
+
+# Works out all the stats from sorted schedules, prices with their period
+# offsets and the realized surplus of every period
+def market_stats(demand, supply, prices, offsets, realized_surplus) -> MarketStats:
+    quantity, low, high = equilibrium(demand, supply)
+    price = (low + high) / 2
+    best = max_surplus(demand, supply)
+    # Equilibrium values are per session, stats are per period
+    per_period = lambda x: np.asarray(x)[..., None]
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        efficiency = np.asarray(realized_surplus) / per_period(best)
+    rms = rms_deviation(prices, offsets, per_period(price))
+
+    return MarketStats(
+        equilibrium_quantity=quantity,
+        equilibrium_low=low,
+        equilibrium_high=high,
+        equilibrium_price=price,
+        max_surplus=best,
+        trades=np.diff(offsets, axis=-1),
+        realized_surplus=np.asarray(realized_surplus),
+        efficiency=efficiency,
+        rms_deviation=rms,
+        smiths_alpha=smiths_alpha(rms, per_period(price)),
+    )
+
+
+# Stats of one market from its schedule and its ledger (`LedgerReader`)
+def ledger_stats(schedule, ledger) -> MarketStats:
+    is_bidder = np.frombuffer(schedule.is_bidder, dtype=np.int8).astype(bool)
+    demand, supply = schedules(_values_with_lengths(schedule), is_bidder)
+    offsets = ledger.period_offsets()
+    realized = segment_sums(ledger.bidder_profit, offsets) + segment_sums(ledger.seller_profit, offsets)
+    return market_stats(demand, supply, ledger.price, offsets, realized)
+
+
+# Stats of every session of a `batch.BatchResult`, `values` are the sessions'
+# own schedules if they had them
+def batch_stats(schedule, result, values: np.ndarray|None = None) -> MarketStats:
+    is_bidder = np.frombuffer(schedule.is_bidder, dtype=np.int8).astype(bool)
+    if values is None:
+        values = _values_with_lengths(schedule)
+    demand, supply = schedules(values, is_bidder)
+    return market_stats(demand, supply, result.prices, result.offsets, result.surplus)
+
+
+# Value matrix where padding past a trader's schedule can never trade
+def _values_with_lengths(schedule) -> np.ndarray:
+    values = schedule.value_matrix().astype(np.float64)
+    lengths = np.frombuffer(schedule.lengths, dtype=np.int64)
+    is_bidder = np.frombuffer(schedule.is_bidder, dtype=np.int8).astype(bool)
+    padding = np.arange(schedule.width) >= lengths[:, None]
+    return np.where(padding, np.where(is_bidder, -np.inf, np.inf)[:, None], values)
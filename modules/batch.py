@@ -0,0 +1,260 @@
+from dataclasses import dataclass
+import numpy as np
+from modules.book import Schedule
+from modules.strategy import StrategyMix
+
+# Same reasons as in `market`, stored as small ints per session and period
+EXHAUSTED, NO_GAINS, OUT_OF_STEPS = 0, 1, 2
+
+
+@dataclass
+class BatchResult:
+    # Every transaction price of every session, session after session and
+    # period after period within a session
+    prices: np.ndarray
+    # offsets[b, p]:offsets[b, p+1] are the prices of session b in period p
+    offsets: np.ndarray
+    # Realized surplus (sum of bidder and seller profits), sessions x periods
+    surplus: np.ndarray
+    # Why each period ended, sessions x periods
+    reasons: np.ndarray
+    # Offer draws made in each period, sessions x periods
+    draws: np.ndarray
+
+    # Prices of one session in the same shape `market.market()` returns
+    def session_prices(self, b: int) -> list[list[int]]:
+        return [
+            self.prices[self.offsets[b, p]:self.offsets[b, p+1]].tolist()
+            for p in range(self.offsets.shape[1] - 1)
+        ]
+
+    def trades_per_period(self) -> np.ndarray:
+        return np.diff(self.offsets, axis=1)
+
+
+# Runs `sessions` independent markets in lockstep. It follows the same rules
+# as `market.market()`: a random active trader makes an offer (see
+# `modules.strategy`), better offers replace the standing bid/ask, crossing
+# offers trade at the standing price and then the bid/ask start over.
+#
+# When everyone is ZI-C or ZI-U, most draws don't beat the standing bid/ask
+# and change nothing, so instead of making them one by one every step skips
+# straight to the next improving offer: the number of draws until then is
+# geometric, the trader who makes it is picked in proportion to their chance
+# of improving, and the offer is uniform over the part of their range that
+# improves. That gives the same distribution of trades as drawing every
+# offer, and the skipped draws still count towards `max_steps`. Other
+# strategies' offers depend on what they've seen, so then every step is one
+# draw in every session, with the strategies making the offers of all
+# sessions in one call and learning from every shout. What they learn
+# carries over from one period to the next.
+#
+# `values` can give each session its own schedule (sessions x traders x
+# width), otherwise every session uses the values in `schedule`
+def batch_market(schedule: Schedule, sessions: int, periods: int = 1, max_steps: int = 100_000, seed=None, values: np.ndarray|None = None) -> BatchResult:
+    if sessions <= 0:
+        raise ValueError("sessions must be greater than 0")
+
+    rng = np.random.default_rng(seed)
+    min_price, max_price = schedule.min_price, schedule.max_price
+    n = schedule.num_traders
+
+    if values is None:
+        values = schedule.value_matrix()[None]
+    if values.shape[1:] != (n, schedule.width) or values.shape[0] not in (1, sessions):
+        raise ValueError(f"values must have shape ({sessions}, {n}, {schedule.width})")
+    per_session = values.shape[0] == sessions
+    # One padding column so exhausted traders can still be looked up, then
+    # flattened so every lookup is a single gather
+    width = schedule.width + 1
+    flat_values = np.concatenate([values, np.zeros(values.shape[:2] + (1,), dtype=values.dtype)], axis=2).ravel()
+    unit_offsets = np.arange(n) * width
+
+    is_bidder = np.frombuffer(schedule.is_bidder, dtype=np.int8).astype(bool)
+    constrained = np.frombuffer(schedule.constrained, dtype=np.int8).astype(bool)
+    lengths = np.frombuffer(schedule.lengths, dtype=np.int64)
+    mix = StrategyMix(schedule.strategies, is_bidder, sessions, min_price, max_price, rng)
+
+    surplus = np.zeros((sessions, periods), dtype=np.int64)
+    reasons = np.full((sessions, periods), OUT_OF_STEPS, dtype=np.int8)
+    counts = np.zeros((sessions, periods), dtype=np.int64)
+    draws = np.zeros((sessions, periods), dtype=np.int64)
+    # Trades get recorded as they happen and sorted by session at the end
+    keys, recorded = [], []
+
+    # Trades of sessions `c`: surplus, price and count
+    def record(c, sid, row, traded, b, a, price, p):
+        surplus[sid[c], p] += (flat_values[row[c] + b * width + traded[c, b]]
+                               - flat_values[row[c] + a * width + traded[c, a]])
+        keys.append(sid[c] * periods + p)
+        recorded.append(price)
+        counts[sid[c], p] += 1
+
+    # Shifts that take one side out of a max/min against the standing bid/ask
+    far = 2**40
+    seller_shift = np.where(is_bidder, 0, far)
+    bidder_shift = np.where(is_bidder, far, 0)
+
+    # Who's left, their current values and why the period is over (-1 while
+    # it isn't), like `market.trading_over()`
+    def positions(traded, row):
+        alive = traded < lengths
+        current = flat_values[row[:, None] + unit_offsets + traded]
+        num_bidders = (alive & is_bidder).sum(axis=1)
+        num_active = alive.sum(axis=1)
+        limit = np.where(constrained, current, np.where(is_bidder, max_price, min_price))
+        best_bid = np.where(alive & is_bidder, limit, min_price - 1).max(axis=1)
+        best_ask = np.where(alive & ~is_bidder, limit, max_price + 1).min(axis=1)
+        over = np.where((num_bidders == 0) | (num_bidders == num_active), EXHAUSTED, np.where(best_bid < best_ask, NO_GAINS, -1))
+        return alive, current, num_active, over
+
+    # Every trader's offer range for their current unit. These only change
+    # when a session trades, so they're kept between steps
+    def offer_ranges(traded, row):
+        alive, current, num_active, over = positions(traded, row)
+        lo, hi = mix.ranges(current)
+        # Exhausted traders get looked up in the padding, their chance is 0
+        return alive, lo, hi, alive / np.maximum(hi - lo + 1, 1), num_active, over
+
+    def skipping_period(p):
+        # All the state is kept only for the sessions still trading (`sid`)
+        # and gets compacted whenever some of them finish
+        sid = np.arange(sessions)
+        row = sid * n * width if per_session else np.zeros(sessions, dtype=np.int64)
+        traded = np.zeros((sessions, n), dtype=np.int64)
+        steps = np.zeros(sessions, dtype=np.int64)
+        bid = np.full(sessions, min_price - 1)
+        ask = np.full(sessions, max_price + 1)
+        last_bidder = np.zeros(sessions, dtype=np.int64)
+        last_seller = np.zeros(sessions, dtype=np.int64)
+        alive, lo, hi, inv_span, num_active, over = offer_ranges(traded, row)
+
+        while len(sid):
+            live = len(sid)
+            ar = np.arange(live)
+
+            # The part of each active trader's range that beats the standing
+            # bid/ask, and their chance of landing in it
+            better_lo = np.maximum(lo, (bid + 1)[:, None] - seller_shift)
+            better_hi = np.minimum(hi, (ask - 1)[:, None] + bidder_shift)
+            better = np.maximum(better_hi - better_lo + 1, 0)
+            cum = (better * inv_span).cumsum(axis=1)
+            total = cum[:, -1]
+
+            # Same end as `market.trading_over()`, which only changes with a
+            # trade. While there are gains from trade left somebody can always
+            # improve on the standing bid/ask, so `total` is never 0 then
+            stuck = over >= 0
+
+            # Draws until the next improving offer, the last one included
+            p_improve = np.where(stuck, 1, total / np.maximum(num_active, 1))
+            steps += rng.geometric(np.minimum(p_improve, 1))
+            out_of_steps = ~stuck & (steps > max_steps)
+
+            # Who makes it and what they offer
+            u = rng.random((2, live))
+            t = np.minimum((cum <= (u[0] * total)[:, None]).sum(axis=1), n - 1)
+            offer = better_lo[ar, t] + (u[1] * better[ar, t]).astype(np.int64)
+
+            finished = stuck | out_of_steps
+            reasons[sid[stuck], p] = over[stuck]
+            draws[sid[stuck], p] = steps[stuck] - 1
+            draws[sid[out_of_steps], p] = max_steps
+
+            # Better offers replace the standing bid/ask
+            bidder = is_bidder[t] & ~finished
+            seller = ~is_bidder[t] & ~finished
+            bid = np.where(bidder, offer, bid)
+            ask = np.where(seller, offer, ask)
+            last_bidder = np.where(bidder, t, last_bidder)
+            last_seller = np.where(seller, t, last_seller)
+
+            # Sessions where the offers cross trade at the standing price,
+            # which is the side that didn't just move
+            c = np.flatnonzero(~finished & (bid >= ask))
+            if len(c):
+                b, a = last_bidder[c], last_seller[c]
+                record(c, sid, row, traded, b, a, np.where(bidder[c], ask[c], bid[c]), p)
+                traded[c, b] += 1
+                traded[c, a] += 1
+                bid[c] = min_price - 1
+                ask[c] = max_price + 1
+                alive[c], lo[c], hi[c], inv_span[c], num_active[c], over[c] = offer_ranges(traded[c], row[c])
+
+            if finished.any():
+                keep = ~finished
+                sid, row, traded, steps = sid[keep], row[keep], traded[keep], steps[keep]
+                bid, ask, last_bidder, last_seller = bid[keep], ask[keep], last_bidder[keep], last_seller[keep]
+                alive, lo, hi, inv_span, num_active, over = alive[keep], lo[keep], hi[keep], inv_span[keep], num_active[keep], over[keep]
+
+    def lockstep_period(p):
+        sid = np.arange(sessions)
+        row = sid * n * width if per_session else np.zeros(sessions, dtype=np.int64)
+        traded = np.zeros((sessions, n), dtype=np.int64)
+        steps = np.zeros(sessions, dtype=np.int64)
+        bid = np.full(sessions, min_price - 1)
+        ask = np.full(sessions, max_price + 1)
+        last_bidder = np.zeros(sessions, dtype=np.int64)
+        last_seller = np.zeros(sessions, dtype=np.int64)
+        alive, current, num_active, over = positions(traded, row)
+
+        while True:
+            finished = (over >= 0) | (steps == max_steps)
+            if finished.any():
+                reasons[sid[finished], p] = np.where(over[finished] >= 0, over[finished], OUT_OF_STEPS)
+                draws[sid[finished], p] = steps[finished]
+                keep = ~finished
+                sid, row, traded, steps = sid[keep], row[keep], traded[keep], steps[keep]
+                bid, ask, last_bidder, last_seller = bid[keep], ask[keep], last_bidder[keep], last_seller[keep]
+                alive, current, num_active, over = alive[keep], current[keep], num_active[keep], over[keep]
+            if len(sid) == 0:
+                break
+            ar = np.arange(len(sid))
+            steps += 1
+
+            # A random active trader of every session and their offer
+            u = rng.random((2, len(sid)))
+            t = (alive.cumsum(axis=1) <= (u[0] * num_active).astype(np.int64)[:, None]).sum(axis=1)
+            offer = mix.offers(sid, t, current[ar, t], u[1])
+
+            bidding = is_bidder[t]
+            bidder = bidding & (offer > bid)
+            seller = ~bidding & (offer < ask)
+            bid = np.where(bidder, offer, bid)
+            ask = np.where(seller, offer, ask)
+            last_bidder = np.where(bidder, t, last_bidder)
+            last_seller = np.where(seller, t, last_seller)
+
+            crossed = bid >= ask
+            price = np.where(bidding, ask, bid)
+            mix.observe(sid, offer, bidding, crossed, price, current, alive)
+
+            c = np.flatnonzero(crossed)
+            if len(c):
+                b, a = last_bidder[c], last_seller[c]
+                record(c, sid, row, traded, b, a, price[c], p)
+                traded[c, b] += 1
+                traded[c, a] += 1
+                bid[c] = min_price - 1
+                ask[c] = max_price + 1
+                alive[c], current[c], num_active[c], over[c] = positions(traded[c], row[c])
+
+    for p in range(periods):
+        if mix.zero_intelligence:
+            skipping_period(p)
+        else:
+            lockstep_period(p)
+
+    if recorded:
+        keys = np.concatenate(keys)
+        # Stable so trades stay in the order they happened
+        order = np.argsort(keys, kind='stable')
+        prices = np.concatenate(recorded)[order]
+    else:
+        prices = np.zeros(0, dtype=np.int64)
+
+    offsets = np.zeros((sessions, periods + 1), dtype=np.int64)
+    offsets[:, 1:] = counts.cumsum(axis=1)
+    offsets += np.concatenate([[0], counts.sum(axis=1).cumsum()[:-1]])[:, None]
+
+    return BatchResult(prices=prices, offsets=offsets, surplus=surplus, reasons=reasons, draws=draws)
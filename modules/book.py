@@ -0,0 +1,185 @@
+import heapq
+from array import array
+import numpy as np
+from modules.strategy import STRATEGIES
+
+# The part of a list of traders that never changes during a market: names,
+# roles, strategies, constraints and schedules. Every column is a flat `array` so the
+# auction loop can index it cheaply, and `value_matrix()` gives a zero-copy
+# NumPy view of the values for anything vectorized
+class Schedule:
+    def __init__(self, traders: list, min_price: int, max_price: int):
+        if len(traders) == 0:
+            raise ValueError("Empty list")
+
+        self.min_price = min_price
+        self.max_price = max_price
+        self.num_traders = len(traders)
+        # Schedules can have different lengths, shorter rows get padded
+        self.width = max(len(t.redemptions_or_costs) for t in traders)
+
+        self.names = [t.name for t in traders]
+        self.is_bidder = array('b', [t.is_bidder for t in traders])
+        self.constrained = array('b', [t.constrained for t in traders])
+        self.strategies = [t.strategy for t in traders]
+        self.lengths = array('q', [len(t.redemptions_or_costs) for t in traders])
+
+        # Row-major num_traders x width, bidders' values are already sorted
+        # decreasing and sellers' increasing by `Trader`
+        self.values = array('q', bytes(8 * self.num_traders * self.width))
+        for i, t in enumerate(traders):
+            self.values[i*self.width : i*self.width + len(t.redemptions_or_costs)] = array('q', t.redemptions_or_costs)
+
+    # Builds a schedule straight from a traders x units matrix of values
+    # (already sorted the way `Trader` sorts them) without making any traders.
+    # `lengths` are how many units each trader has, all of them by default.
+    # Every trader uses ZI-C or ZI-U by `constrained` unless they get
+    # `strategies`, which then decide who's constrained
+    @classmethod
+    def from_arrays(cls, values: np.ndarray, is_bidder, constrained, min_price: int, max_price: int, names: list[str]|None = None, lengths=None, strategies: list[str]|None = None) -> 'Schedule':
+        values = np.asarray(values, dtype=np.int64)
+        if values.ndim != 2 or len(values) == 0:
+            raise ValueError("values must be a non-empty traders x units matrix")
+
+        schedule = cls.__new__(cls)
+        schedule.min_price = min_price
+        schedule.max_price = max_price
+        schedule.num_traders, schedule.width = values.shape
+        is_bidder = np.broadcast_to(np.asarray(is_bidder, dtype=bool), (schedule.num_traders,))
+        if strategies == None:
+            constrained = np.broadcast_to(np.asarray(constrained, dtype=bool), (schedule.num_traders,))
+            strategies = ['zic' if c else 'ziu' for c in constrained.tolist()]
+        elif len(strategies) != schedule.num_traders:
+            raise ValueError("Every trader needs a strategy")
+        else:
+            constrained = np.array([STRATEGIES[s].constrained for s in strategies], dtype=bool)
+
+        if names is None:
+            names = [f"{'b' if b else 's'}{i}" for i, b in enumerate(is_bidder)]
+        schedule.names = list(names)
+        schedule.is_bidder = array('b', is_bidder.astype(np.int8).tobytes())
+        schedule.constrained = array('b', constrained.astype(np.int8).tobytes())
+        schedule.strategies = list(strategies)
+        if lengths is None:
+            schedule.lengths = array('q', [schedule.width] * schedule.num_traders)
+        else:
+            schedule.lengths = array('q', np.broadcast_to(np.asarray(lengths, dtype=np.int64), (schedule.num_traders,)).tobytes())
+        schedule.values = array('q', values.tobytes())
+        return schedule
+
+    def value_matrix(self) -> np.ndarray:
+        return np.frombuffer(self.values, dtype=np.int64).reshape(self.num_traders, self.width)
+
+
+# The part that changes while trading: units bought/sold, current offers,
+# profits and who's still in the pool. `reset()` puts it back to the start of
+# a period in place, so running another period doesn't allocate anything
+class TraderBook:
+    def __init__(self, schedule: Schedule):
+        self.schedule = schedule
+        # Shortcuts to the schedule
+        self.names = schedule.names
+        self.is_bidder = schedule.is_bidder
+        self.constrained = schedule.constrained
+        self.lengths = schedule.lengths
+        self.values = schedule.values
+        self.width = schedule.width
+
+        n = schedule.num_traders
+        # Units bought/sold, latest offer and total profit for each trader
+        self.traded = array('q', bytes(8 * n))
+        self.offers = array('q', bytes(8 * n))
+        self.profits = array('q', bytes(8 * n))
+
+        # Active traders sit in active[:num_active], `slot` says where each
+        # trader is in there so removing one is a swap with the last
+        self.active = array('q', range(n))
+        self.slot = array('q', range(n))
+
+        # Lazy heaps of the best offer limits on each side (bid limits are
+        # negated), stale entries get thrown out when they reach the top
+        self.bid_limits = []
+        self.ask_limits = []
+
+        self.reset()
+
+    def reset(self):
+        for column in (self.traded, self.offers, self.profits):
+            np.frombuffer(column, dtype=np.int64)[:] = 0
+        active = np.frombuffer(self.active, dtype=np.int64)
+        active[:] = np.arange(len(active))
+        np.frombuffer(self.slot, dtype=np.int64)[:] = active
+
+        self.num_active = self.schedule.num_traders
+        self.num_bidders = sum(self.is_bidder)
+        self.num_sellers = self.num_active - self.num_bidders
+
+        self.bid_limits.clear()
+        self.ask_limits.clear()
+        for i in range(self.schedule.num_traders):
+            if self.lengths[i] == 0:
+                self.remove(i)
+            else:
+                self._push_limit(i)
+
+    def current_value(self, i: int) -> int:
+        return self.values[i*self.width + self.traded[i]]
+
+    # Highest bid (lowest ask for sellers) trader i could ever make for their
+    # current unit, constrained traders can't go past their value
+    def offer_limit(self, i: int) -> int:
+        if not self.constrained[i]:
+            return self.schedule.max_price if self.is_bidder[i] else self.schedule.min_price
+        return self.current_value(i)
+
+    def _push_limit(self, i: int):
+        if self.is_bidder[i]:
+            heapq.heappush(self.bid_limits, (-self.offer_limit(i), i))
+        else:
+            heapq.heappush(self.ask_limits, (self.offer_limit(i), i))
+
+    def _best(self, heap: list, sign: int) -> int|None:
+        while heap:
+            limit, i = heap[0]
+            if self.slot[i] < self.num_active and sign * limit == self.offer_limit(i):
+                return sign * limit
+            heapq.heappop(heap)
+        return None
+
+    # Best remaining redemption value of the active bidders (or max_price
+    # when one of them is unconstrained)
+    def best_bid_limit(self) -> int|None:
+        return self._best(self.bid_limits, -1)
+
+    # Cheapest remaining cost of the active sellers (or min_price when one of
+    # them is unconstrained)
+    def best_ask_limit(self) -> int|None:
+        return self._best(self.ask_limits, 1)
+
+    def remove(self, i: int):
+        last = self.active[self.num_active - 1]
+        pos = self.slot[i]
+        self.active[pos] = last
+        self.slot[last] = pos
+        self.active[self.num_active - 1] = i
+        self.slot[i] = self.num_active - 1
+        self.num_active -= 1
+
+        if self.is_bidder[i]:
+            self.num_bidders -= 1
+        else:
+            self.num_sellers -= 1
+
+    # Trader i buys/sells their current unit at `price`, returns their profit.
+    # Traders get taken out of the pool as soon as they run out of units
+    def transact(self, i: int, price: int) -> int:
+        current_value = self.current_value(i)
+        profit = current_value - price if self.is_bidder[i] else price - current_value
+
+        self.profits[i] += profit
+        self.traded[i] += 1
+        if self.traded[i] == self.lengths[i]:
+            self.remove(i)
+        else:
+            self._push_limit(i)
+        return profit
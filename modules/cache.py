@@ -0,0 +1,197 @@
+import hashlib
+import os
+import zipfile
+import numpy as np
+import modules.market as market
+from modules.book import Schedule
+from modules.config import Config
+from modules.ledger import COLUMNS, TIMED_OUT, MemoryLedger, StdoutLedger
+
+# Goes into every key, bump it whenever an engine changes what it gives back
+# for the same settings and seed so old results stop matching
+ENGINE_VERSION = 5
+
+# Settings that change what a market does. The rest (printing, graphs, where
+# the ledger goes, how many workers, the sweep) don't change the results, and
+# `constrained` gets its own place in the key since it can be overridden
+MARKET_FIELDS = ('min_price', 'max_price', 'num_traders', 'periods', 'strategies', 'costs', 'redemption_values', 'trader_schedules', 'distribution', 'distribution_params', 'num_commodities', 'max_steps')
+
+
+# Same parts always give the same key, no matter the process or run
+def cache_key(*parts) -> str:
+    return hashlib.sha256(repr((ENGINE_VERSION,) + parts).encode()).hexdigest()
+
+
+def market_key(config: Config, constrained: bool, seed) -> str:
+    settings = tuple((name, getattr(config, name)) for name in MARKET_FIELDS)
+    return cache_key('market', settings, bool(constrained), seed)
+
+
+# Results kept on disk as one .npz file of named arrays per key. Reading a
+# result marks it as used, and once the files take up more than `max_bytes`
+# the least recently used ones get deleted. How much they take up is kept as
+# a running total, so the folder only gets looked through when that goes
+# over (which also catches up with anything other processes wrote)
+class ResultCache:
+    def __init__(self, path: str = '.cache', max_bytes: int = 256 * 2**20):
+        if max_bytes <= 0:
+            raise ValueError("max_bytes must be greater than 0")
+
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(path, exist_ok=True)
+        self.bytes = self.size()
+
+    @classmethod
+    def from_config(cls, config: Config) -> 'ResultCache|None':
+        if not config.cache:
+            return None
+        return cls(config.cache, config.cache_size * 2**20)
+
+    def file(self, key: str) -> str:
+        return os.path.join(self.path, f"{key}.npz")
+
+    # The arrays stored under `key`, None if there aren't any
+    def get(self, key: str) -> dict[str, np.ndarray]|None:
+        file = self.file(key)
+        try:
+            with np.load(file, allow_pickle=False) as entry:
+                arrays = {name: entry[name] for name in entry.files}
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except (OSError, ValueError, zipfile.BadZipFile):
+            # Half-written or broken, it gets written again
+            self.misses += 1
+            self.bytes -= os.path.getsize(file)
+            os.remove(file)
+            return None
+
+        # The modification time is when it was last used
+        os.utime(file)
+        self.hits += 1
+        return arrays
+
+    def put(self, key: str, arrays: dict[str, np.ndarray]):
+        # Written to the side and moved in place so nobody reads half of it
+        temporary = os.path.join(self.path, f"{key}.{os.getpid()}.tmp")
+        with open(temporary, 'wb') as f:
+            np.savez(f, **arrays)
+        file = self.file(key)
+        try:
+            self.bytes -= os.path.getsize(file)
+        except FileNotFoundError:
+            pass
+        self.bytes += os.path.getsize(temporary)
+        os.replace(temporary, file)
+        if self.bytes > self.max_bytes:
+            self.evict()
+
+    # Deletes the least recently used results until everything fits
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.path):
+            if name.endswith('.npz'):
+                stat = os.stat(os.path.join(self.path, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.path, name))
+            total -= size
+            self.evictions += 1
+        self.bytes = total
+
+    def size(self) -> int:
+        return sum(entry.stat().st_size for entry in os.scandir(self.path) if entry.name.endswith('.npz'))
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'bytes': self.size(),
+        }
+
+    def clear(self):
+        for name in os.listdir(self.path):
+            if name.endswith('.npz'):
+                os.remove(os.path.join(self.path, name))
+        self.bytes = 0
+
+
+# A market's traders and ledger as arrays for the cache
+def _market_arrays(schedule: Schedule, ledger: MemoryLedger) -> dict[str, np.ndarray]:
+    arrays = {f"column_{name}": column for name, column in ledger.columns.items()}
+    arrays['reasons'] = np.array(ledger.reasons, dtype=str)
+    arrays['names'] = np.array(schedule.names, dtype=str)
+    arrays['values'] = schedule.value_matrix()
+    arrays['lengths'] = np.frombuffer(schedule.lengths, dtype=np.int64)
+    arrays['is_bidder'] = np.frombuffer(schedule.is_bidder, dtype=np.int8)
+    arrays['strategies'] = np.array(schedule.strategies, dtype=str)
+    return arrays
+
+
+def _market_from_arrays(arrays: dict[str, np.ndarray]) -> tuple[list[market.Trader], MemoryLedger]:
+    traders = [
+        market.Trader(
+            name=str(name),
+            bidder=bool(is_bidder),
+            redemptions_or_costs=values[:length].tolist(),
+            strategy=str(strategy))
+        for name, is_bidder, values, length, strategy
+        in zip(arrays['names'], arrays['is_bidder'], arrays['values'], arrays['lengths'], arrays['strategies'])
+    ]
+
+    ledger = MemoryLedger()
+    ledger.columns = {name: arrays[f"column_{name}"] for name in COLUMNS}
+    ledger.reasons = arrays['reasons'].tolist()
+    ledger.names = arrays['names'].tolist()
+    ledger.close()
+    return traders, ledger
+
+
+# Generates the traders described by `config` (with `constrained` overriding
+# the config, like `market.gen_traders()`) and runs the market with them, both
+# from the config's seed. When `cache` has the result nothing gets simulated, the
+# cached ledger gets written into `ledgers` (and printed when `config.quiet`
+# is off) as if the market had just run. Returns the traders and the whole
+# ledger. Results of periods that timed out depend on the machine and
+# results of a seed that got picked (`config.seed_picked`) can't be asked for
+# again, so neither of those get cached
+def cached_market(config: Config, constrained: bool|None = None, cache: ResultCache|None = None, ledgers: tuple = ()) -> tuple[list[market.Trader], MemoryLedger]:
+    if constrained == None:
+        constrained = config.constrained
+    if config.seed_picked:
+        cache = None
+    key = market_key(config, constrained, config.random_seed)
+
+    arrays = cache.get(key) if cache != None else None
+    if arrays != None:
+        traders, ledger = _market_from_arrays(arrays)
+        if config.quiet != True:
+            ledgers = (*ledgers, StdoutLedger(config.timeout))
+        schedule = Schedule(traders, config.min_price, config.max_price)
+        for replay in ledgers:
+            replay.start(schedule)
+        for period, trades, reason in ledger.period_trades():
+            for replay in ledgers:
+                replay.write_period(period, trades, reason)
+        for replay in ledgers:
+            replay.close()
+        return traders, ledger
+
+    traders = market.gen_traders(config, constrained)
+    ledger = MemoryLedger()
+    market.market(traders, config, ledgers=(*ledgers, ledger))
+
+    if cache != None and TIMED_OUT not in ledger.reasons:
+        cache.put(key, _market_arrays(Schedule(traders, config.min_price, config.max_price), ledger))
+    return traders, ledger
@@ -1,77 +1,265 @@
-import random
+import hashlib
+import secrets
 import tomllib
+from dataclasses import dataclass, fields, replace
 
-with open('config.toml', 'rb') as f:
-    # Load in the data
-    config = tomllib.load(f)
+# Everything that can be set for a market. It's frozen so it can be hashed,
+# cached and sent to pool workers, and it's validated once when it's made.
+# Use `dataclasses.replace()` to get a copy with some settings changed
+@dataclass(frozen=True)
+class Config:
+    min_price: int = 1
+    max_price: int = 200
+    num_traders: int = 4
+    periods: int = 6
+    constrained: bool = True
+    # Trading strategies (see `modules.strategy`) the bidders take in turn,
+    # and so do the sellers. Empty for ZI-C or ZI-U by `constrained`
+    strategies: tuple[str, ...] = ()
 
-    min_price = int(config['min_price'])
-    max_price = int(config['max_price'])
-    num_traders = int(config['num_traders'])
-    periods = int(config['periods'])
-    constrained = bool(config['constrained'])
+    # explicit, None for random
+    costs: tuple[int, ...]|None = None
+    redemption_values: tuple[int, ...]|None = None
+    # Every trader's own schedule as ((bidder, (values, ...)), ...), overrides
+    # costs and redemption_values and sets num_traders
+    trader_schedules: tuple = ()
 
-    # explicit
-    costs = sorted(list(config['explicit']['costs']))
-    redemption_values = sorted(list(config['explicit']['redemption_values']), reverse=True)
+    # Where random schedules come from (see `modules.population`) and its
+    # settings, kept as ((key, value), ...) to stay hashable
+    distribution: str = "uniform"
+    distribution_params: tuple = ()
 
     # misc.
-    num_commodities = int(config['misc']['num_commodities'])
-    timeout = int(config['misc']['timeout'])
-    quiet = bool(config['misc']['quiet'])
-    random_seed = config['misc']['random_seed']
-    graphs = int(config['misc']['graphs'])
+    num_commodities: int = 20
+    max_steps: int = 100_000
+    # Random numbers drawn at a time (see `modules.rng`), bigger blocks are
+    # quicker but take more memory. Doesn't change the results
+    block_size: int = 4096
+    timeout: float = 1.0
+    workers: int = 1
+    # 0 picks a random seed (and keeps it so runs can be reproduced)
+    random_seed: int|float|str|bytes = 0
+    # Set when the seed got picked that way. Nobody can ask for those results
+    # again, so they don't get cached
+    seed_picked: bool = False
+    quiet: bool = True
+    # Folder for the binary transaction ledger, empty to not save it
+    ledger: str = ""
+    # Folder for cached results (see `modules.cache`), empty to not cache, and
+    # how many megabytes it can take up before the least recently used
+    # results get thrown out
+    cache: str = ""
+    cache_size: int = 256
+    graphs: int = 0
 
-# Validation and setting defaults
-if type(random_seed) not in (int, float, str, bytes, bytearray):
-    raise TypeError("The only supported types for random_seed are: int, float, str, bytes, and bytearray")
+    # sweep, the grid is kept as ((key, (values, ...)), ...) to stay hashable
+    sweep_seeds: int = 1
+    sweep_sessions: int = 100
+    sweep_workers: int = 0
+    sweep_grid: tuple = ()
+    # Folder to save a figure of every grid point in, empty for no figures
+    sweep_figures: str = ""
+    sweep_figure_format: str = "png"
+    # SQLite file every finished unit goes into as it finishes (see
+    # `modules.store`), so a stopped sweep can pick up where it left off.
+    # Empty for none
+    sweep_store: str = ""
 
-if random_seed == 0:
-    # Need this for reproducing traders (i.e. for the big graph = 4)
-    random_seed = random.randint(0, 2**32 - 1)
+    def __post_init__(self):
+        # Fixing up types, the dataclass is frozen so this needs object.__setattr__
+        fix = lambda name, value: object.__setattr__(self, name, value)
 
-random.seed(random_seed)
+        fix('min_price', int(self.min_price))
+        fix('max_price', int(self.max_price))
+        fix('num_traders', int(self.num_traders))
+        fix('periods', int(self.periods))
+        fix('constrained', bool(self.constrained))
+        fix('num_commodities', int(self.num_commodities))
+        fix('distribution', str(self.distribution))
+        fix('max_steps', int(self.max_steps))
+        fix('block_size', int(self.block_size))
+        fix('timeout', float(self.timeout))
+        fix('workers', int(self.workers))
+        fix('quiet', bool(self.quiet))
+        fix('ledger', str(self.ledger))
+        fix('cache', str(self.cache))
+        fix('cache_size', int(self.cache_size))
+        fix('graphs', int(self.graphs))
+        fix('sweep_seeds', int(self.sweep_seeds))
+        fix('sweep_sessions', int(self.sweep_sessions))
+        fix('sweep_workers', int(self.sweep_workers))
+        fix('sweep_figures', str(self.sweep_figures))
+        fix('sweep_figure_format', str(self.sweep_figure_format))
+        fix('sweep_store', str(self.sweep_store))
 
-if min_price > max_price:
-    raise ValueError("min_price must be less than max_price")
-if min_price < 0:
-    raise ValueError("min_price must be greater than 0")
-if max_price < 0:
-    raise ValueError("max_price must be greater than 0")
+        # Validation for the seed
+        if type(self.random_seed) not in (int, float, str, bytes, bytearray):
+            raise TypeError("The only supported types for random_seed are: int, float, str, bytes, and bytearray")
+        if type(self.random_seed) == bytearray:
+            fix('random_seed', bytes(self.random_seed))
+        # -k and k would give the same streams
+        if type(self.random_seed) == int and self.random_seed < 0:
+            raise ValueError("random_seed can't be negative")
+        if self.random_seed == 0:
+            # Need this for reproducing traders (i.e. for the big graph = 4)
+            fix('random_seed', secrets.randbits(32))
+            fix('seed_picked', True)
+        fix('seed_picked', bool(self.seed_picked))
 
-if num_traders <= 0:
-    raise ValueError("num_traders must be greater than 0")
-if num_traders % 2 != 0:
-    raise ValueError("num_traders must be even (should be the same number of buyers as bidders)")
+        # Validation for prices
+        if self.min_price > self.max_price:
+            raise ValueError("min_price must be less than max_price")
+        if self.min_price < 0:
+            raise ValueError("min_price must be greater than 0")
+        if self.max_price < 0:
+            raise ValueError("max_price must be greater than 0")
 
-if periods <= 0:
-    raise ValueError("periods must be greater than 0")
+        # Validation for every trader's own schedule, given as (bidder, values)
+        # pairs or as tables with bidder and values like in config.toml.
+        # Values get sorted the way `Trader` sorts them
+        trader_schedules = []
+        for schedule in self.trader_schedules:
+            if type(schedule) == dict:
+                if set(schedule) != {'bidder', 'values'}:
+                    raise ValueError("Every trader schedule needs exactly a bidder and values")
+                schedule = (schedule['bidder'], schedule['values'])
+            bidder, values = schedule
+            if type(bidder) != bool:
+                raise TypeError("bidder must be true or false")
+            if len(values) == 0:
+                raise ValueError("Trader schedules can't be empty")
+            trader_schedules.append((bidder, tuple(sorted((int(v) for v in values), reverse=bidder))))
+        fix('trader_schedules', tuple(trader_schedules))
+        if self.trader_schedules:
+            if all(bidder for bidder, _ in self.trader_schedules) or not any(bidder for bidder, _ in self.trader_schedules):
+                raise ValueError("trader_schedules needs at least one bidder and one seller")
+            fix('num_traders', len(self.trader_schedules))
 
-if len(costs) != len(redemption_values):
-    raise ValueError(f"The length of the costs {len(costs)} must be equal to the length of redemption_values {len(redemption_values)}")
+        # Validation for the traders
+        if self.num_traders <= 0:
+            raise ValueError("num_traders must be greater than 0")
+        if self.num_traders % 2 != 0 and not self.trader_schedules:
+            raise ValueError("num_traders must be even (should be the same number of buyers as bidders)")
+        if self.num_commodities <= 0:
+            raise ValueError("num_commodities must be greater than 0")
 
-if len(costs) == 0:
-    costs = None
-if len(redemption_values) == 0:
-    redemption_values = None
+        # Validation for how long the market runs
+        if self.periods <= 0:
+            raise ValueError("periods must be greater than 0")
+        if self.max_steps <= 0:
+            raise ValueError("max_steps must be greater than 0")
+        if self.block_size <= 0:
+            raise ValueError("block_size must be greater than 0")
+        if self.timeout < 0:
+            raise ValueError("timeout must be 0 (no timeout) or greater")
+        if self.workers <= 0:
+            raise ValueError("workers must be greater than 0")
 
-if graphs not in [0, 1, 2, 3, 4]:
-    raise ValueError("graphs can only be either 0, 1, 2, 3, or 4")
+        # Validation for explicit schedules, empty means random
+        costs = tuple(sorted(int(c) for c in self.costs or ()))
+        redemption_values = tuple(sorted((int(r) for r in self.redemption_values or ()), reverse=True))
+        if len(costs) != len(redemption_values):
+            raise ValueError(f"The length of the costs {len(costs)} must be equal to the length of redemption_values {len(redemption_values)}")
+        fix('costs', costs or None)
+        fix('redemption_values', redemption_values or None)
 
-def validate_config(config: dict):
-    required_keys = ["graphs", "market_type", "num_traders", "random_seed"]
-    for key in required_keys:
-        if key not in config:
-            raise ValueError(f"Missing required config key: {key}")
+        # Validation for the strategies, a single one can be given on its own
+        strategies = (self.strategies,) if type(self.strategies) == str else tuple(self.strategies)
+        for name in strategies:
+            if name not in ("zic", "ziu", "zip", "gd"):
+                raise ValueError("strategies can only be 'zic', 'ziu', 'zip' or 'gd'")
+        fix('strategies', strategies)
 
-    if not isinstance(config["graphs"], int) or config["graphs"] <= 0:
-        raise ValueError("`graphs` must be a positive integer")
+        # Validation for random schedules
+        if self.distribution not in ("uniform", "step", "normal", "shifted"):
+            raise ValueError("distribution can only be either 'uniform', 'step', 'normal' or 'shifted'")
+        params = dict(self.distribution_params)
+        # The settings each distribution in `modules.population` takes
+        allowed = {"uniform": (), "step": ("width",), "normal": ("mean", "sd"), "shifted": ("spread",)}[self.distribution]
+        for key, value in params.items():
+            if key not in allowed:
+                raise ValueError(f"The {self.distribution} distribution has no setting {key}, " + (f"only: {', '.join(allowed)}" if allowed else "it doesn't take any"))
+            if type(value) not in (int, float):
+                raise TypeError(f"The distribution setting {key} must be a number")
+        fix('distribution_params', tuple(sorted(params.items())))
 
-    if config["market_type"] not in ["constrained", "unconstrained", "mixed"]:
-        raise ValueError("`market_type` must be one of: 'constrained', 'unconstrained', 'mixed'")
+        if self.cache_size <= 0:
+            raise ValueError("cache_size must be greater than 0")
 
-    if not isinstance(config["num_traders"], int) or config["num_traders"] <= 0:
-        raise ValueError("`num_traders` must be a positive integer")
+        if self.graphs not in [0, 1, 2, 3, 4]:
+            raise ValueError("graphs can only be either 0, 1, 2, 3, or 4")
 
-    if not isinstance(config["random_seed"], int):
-        raise ValueError("`random_seed` must be an integer")
+        # Validation for sweeps
+        if self.sweep_seeds <= 0:
+            raise ValueError("seeds must be greater than 0")
+        if self.sweep_sessions <= 0:
+            raise ValueError("sessions must be greater than 0")
+        if self.sweep_workers < 0:
+            raise ValueError("workers must be 0 (all cores) or greater")
+        if self.sweep_figure_format not in ("png", "svg"):
+            raise ValueError("figure_format can only be either 'png' or 'svg'")
+        grid = dict(self.sweep_grid)
+        for key, values in grid.items():
+            if type(values) not in (list, tuple) or len(values) == 0:
+                raise ValueError(f"The sweep grid for {key} must be a non-empty list")
+        # Values can be lists themselves (like a mix of strategies), those
+        # become tuples all the way down so the config stays hashable
+        frozen = lambda value: tuple(frozen(v) for v in value) if type(value) in (list, tuple) else value
+        fix('sweep_grid', tuple((key, frozen(values)) for key, values in grid.items()))
+
+    # Flat dict of settings, anything left out keeps its default
+    @classmethod
+    def from_dict(cls, settings: dict) -> 'Config':
+        names = {f.name for f in fields(cls)}
+        unknown = set(settings) - names
+        if unknown:
+            raise ValueError(f"Unknown config keys: {', '.join(sorted(unknown))}")
+        return cls(**settings)
+
+    # Dict laid out like config.toml
+    @classmethod
+    def from_toml_dict(cls, config: dict) -> 'Config':
+        explicit = dict(config.get('explicit', {}))
+        population = config.get('population', {})
+        misc = config.get('misc', {})
+        sweep = config.get('sweep', {})
+
+        settings = {key: value for key, value in config.items() if key not in ('explicit', 'population', 'misc', 'sweep')}
+        if 'traders' in explicit:
+            settings['trader_schedules'] = tuple(explicit.pop('traders'))
+        settings.update(explicit)
+        if 'distribution' in population:
+            settings['distribution'] = population['distribution']
+        settings['distribution_params'] = tuple(population.get('params', {}).items())
+        unknown = set(population) - {'distribution', 'params'}
+        if unknown:
+            raise ValueError(f"Unknown config keys: {', '.join(sorted(unknown))}")
+        settings.update(misc)
+        settings.update({f"sweep_{key}": value for key, value in sweep.items() if key != 'grid'})
+        settings['sweep_grid'] = tuple(sweep.get('grid', {}).items())
+        return cls.from_dict(settings)
+
+    @classmethod
+    def from_toml(cls, path: str = 'config.toml') -> 'Config':
+        with open(path, 'rb') as f:
+            return cls.from_toml_dict(tomllib.load(f))
+
+    # Same settings always give the same hash, no matter the process or run
+    @property
+    def content_hash(self) -> str:
+        settings = tuple((f.name, getattr(self, f.name)) for f in fields(self))
+        return hashlib.sha256(repr(settings).encode()).hexdigest()
+
+    # The seed as a non-negative int, for things like NumPy's SeedSequence
+    @property
+    def seed_entropy(self) -> int:
+        if type(self.random_seed) == int:
+            return self.random_seed
+        return int.from_bytes(hashlib.sha256(repr(self.random_seed).encode()).digest()[:8], 'little')
+
+    @property
+    def grid(self) -> dict:
+        return {key: list(values) for key, values in self.sweep_grid}
+
+    def replace(self, **changes) -> 'Config':
+        return replace(self, **changes)
@@ -1,4 +1,5 @@
 import matplotlib.pyplot as plt
+import modules.analytics as analytics
 
 def values_from_traders(list_of_traders) -> tuple:
     # Separating bidders and sellers into two different lists
@@ -21,30 +22,19 @@ def values_from_traders(list_of_traders) -> tuple:
 
     return (costs, redemptions)
 
-def find_equilibrium(costs, redemptions) -> tuple:
-    if type(costs) != list:
+# Equilibrium quantity and price (the middle of the range of prices that clear
+# the market), the price is None if nothing can trade. The work is done and
+# cached by `analytics`, so plotting the same schedules again is free
+def find_equilibrium(costs, redemptions) -> tuple[int, float|None]:
+    if type(costs) not in (list, tuple):
         raise ValueError("Costs must be a list")
-    if type(redemptions) != list:
+    if type(redemptions) not in (list, tuple):
         raise ValueError("Redemptions must be a list")
 
-    costs = sorted(costs)
-    redemptions = sorted(redemptions, reverse=True)
-
-    for i in range(len(redemptions)):
-        # When the values overlap normally
-        if redemptions[i] == costs[i]:
-            eq_p = redemptions[i]
-            eq_q = i
-            return (eq_q, eq_p)
-            
-        # Of the lowest rungs, price becomes the highest (highest price limits)
-        if redemptions[i] < costs[i]:
-            eq_p = max(redemptions[i], costs[i-1])
-            eq_q = i
-            return (eq_q, eq_p)
-
-    # If an equilibrium can't be found, this should hide that
-    return (-1, -1)
+    equilibrium_quantity, low, high = analytics.equilibrium_of(tuple(costs), tuple(redemptions))
+    if equilibrium_quantity == 0:
+        return (0, None)
+    return (equilibrium_quantity, (low + high) / 2)
 
 def plot_supply_demand(costs, redemptions, min_price=None, max_price=None, ax=None):
     # Is this being graphed on its own?
@@ -56,10 +46,11 @@ def plot_supply_demand(costs, redemptions, min_price=None, max_price=None, ax=No
 
     equilibrium_quantity, equilibrium_price = find_equilibrium(costs, redemptions)
 
-    # Funny stuff to graph things correctly
-    costs.sort()
+    # Funny stuff to graph things correctly, on copies so the caller's lists
+    # don't change
+    costs = sorted(costs)
     costs.insert(0, costs[0])
-    redemptions.sort(reverse=True)
+    redemptions = sorted(redemptions, reverse=True)
     redemptions.insert(0, redemptions[0])
 
     # List of index of costs list, should also be able to use the redemptions
@@ -78,16 +69,17 @@ def plot_supply_demand(costs, redemptions, min_price=None, max_price=None, ax=No
     ax.set_ylim(min_price, max_price)
 
     # Dashed equilibrium lines
-    ax.hlines(y=equilibrium_price,
-            xmin=0,
-            xmax=equilibrium_quantity,
-            color='black',
-            linestyles="dashed")
-    ax.vlines(x=equilibrium_quantity,
-            ymin=min_price,
-            ymax=equilibrium_price,
-            color='black',
-            linestyles='dashed')
+    if equilibrium_price != None:
+        ax.hlines(y=equilibrium_price,
+                xmin=0,
+                xmax=equilibrium_quantity,
+                color='black',
+                linestyles="dashed")
+        ax.vlines(x=equilibrium_quantity,
+                ymin=min_price,
+                ymax=equilibrium_price,
+                color='black',
+                linestyles='dashed')
 
     ax.set_box_aspect(1)
     # Prevents plotting too early when doing the side-by-side plot
@@ -102,8 +94,16 @@ def plot_transactions(transaction_history, equilibrium_price: None|int = None, m
     # next to another graph
     ax = ax or plt.gca()
 
+    # Only set when there's more than 1 period
+    period_lengths = None
+
+    # A ledger (`modules.ledger.LedgerReader`) already has its prices in one
+    # column and knows where the periods start
+    if hasattr(transaction_history, 'period_offsets'):
+        period_lengths = list(transaction_history.period_offsets()[1:])
+        transaction_history = transaction_history.price
     # If a list of lists is given, we know that we're graphing more than 1 period
-    if type(transaction_history[0]) == list:
+    elif type(transaction_history[0]) == list:
         enum = enumerate(transaction_history)
         # Flatten the list of lists of transactions
         transaction_history = [
@@ -128,7 +128,7 @@ def plot_transactions(transaction_history, equilibrium_price: None|int = None, m
     # x range goes from 1 to len(transaction_history)+1
     ax.plot(range(1, len(transaction_history)+1), transaction_history)
 
-    if type(period_lengths) != None:
+    if period_lengths != None:
         ax.vlines(period_lengths[:-1],
                    ymin=min_price,
                    ymax=max_price,
@@ -136,7 +136,7 @@ def plot_transactions(transaction_history, equilibrium_price: None|int = None, m
                    linestyles='dashed')
 
     # If the equilibrium price is given, then graph it
-    if type(equilibrium_price) != None:
+    if equilibrium_price != None:
         ax.hlines(y=equilibrium_price,  # Ignore dumb error # type: ignore
                 xmin=1,
                 xmax=len(transaction_history)+1,
@@ -167,33 +167,21 @@ def plot_supply_demand_and_transactions(list_of_traders, prices, min_price = Non
     if single_graph == True:
         plt.show()
 
-def big_graph(list_of_traders, prices, min_price = None, max_price = None):
-    import random
-    import modules.market as market
-    import modules.config as config
-
+# Both runs of the same traders side by side, the unconstrained ones always
+# go on top. Nothing gets simulated here, `main.py` gets the other run from
+# the result cache
+def big_graph(list_of_traders, prices, other_traders, other_prices, min_price = None, max_price = None):
     fig = plt.figure(constrained_layout=True)
     (top, bottom) = fig.subfigures(nrows=2, ncols=1)
     top.suptitle("ZI Traders without Budget Constraint")
     bottom.suptitle("ZI Traders with Budget Constraint")
 
-    # This logic always puts the unconstrained on top
-    if list_of_traders[0].constrained:
-        ax1, ax2 = top.subplots(nrows=1, ncols=2, width_ratios=[1, 2])
-        ax3, ax4 = bottom.subplots(nrows=1, ncols=2, width_ratios=[1, 2])
-    else:
-        ax3, ax4 = top.subplots(nrows=1, ncols=2, width_ratios=[1, 2])
-        ax1, ax2 = bottom.subplots(nrows=1, ncols=2, width_ratios=[1, 2])
-
-    # Normal traders
-    plot_supply_demand_and_transactions(list_of_traders, prices, min_price, max_price, axs=(ax1, ax2))
-
-    # Opposite traders
-    random.seed(config.random_seed)
-    traders = market.gen_traders(not config.constrained)
-    transaction_prices = market.market(traders, timeout=config.timeout, periods=config.periods, quiet=config.quiet)
-
-    plot_supply_demand_and_transactions(traders, transaction_prices, min_price, max_price, axs=(ax3, ax4))
+    runs = [(list_of_traders, prices), (other_traders, other_prices)]
+    # Unconstrained first
+    runs.sort(key=lambda run: run[0][0].constrained)
+    for subfigure, (traders, transaction_prices) in zip((top, bottom), runs):
+        axs = tuple(subfigure.subplots(nrows=1, ncols=2, width_ratios=[1, 2]))
+        plot_supply_demand_and_transactions(traders, transaction_prices, min_price, max_price, axs=axs)
 
     plt.show()
 
@@ -0,0 +1,139 @@
+import cProfile
+import json
+import pstats
+from dataclasses import asdict, dataclass, field
+from modules.book import TraderBook
+from modules.ledger import Trades
+from modules.market import run_period
+from modules.rng import PeriodDraws
+from modules.strategy import StrategyMix
+
+# Instrumentation is only paid for when it's asked for: `market.market()`
+# runs `instrumented_period()` instead of `market.run_period()` when it gets an
+# `Instrumentation`, otherwise nothing here even gets imported. That's the
+# same loop with its counters on, so the trades are the same either way.
+# Exhausted traders are taken out of the pool as soon as they trade their
+# last unit, so no draw ever picks one and there's nothing to count for that
+
+
+@dataclass
+class PeriodStats:
+    period: int = 0
+    reason: str = ''
+    draws: int = 0
+    # Offers that replaced the standing bid/ask
+    improving: int = 0
+    trades: int = 0
+    # Traders who traded their last unit
+    removals: int = 0
+    # Draws since the previous trade (or the start) for every trade, bucket k
+    # counts gaps of 2**k up to 2**(k+1) - 1 draws
+    gap_histogram: list[int] = field(default_factory=list)
+    # Draws after the last trade, before the period ended
+    idle_at_end: int = 0
+    # Seconds spent resetting the book, making and comparing offers and
+    # recording trades (transacting and checking whether trading is over)
+    reset_seconds: float = 0.0
+    offer_seconds: float = 0.0
+    trade_seconds: float = 0.0
+
+
+# `market.run_period()` with its counters on, plus what can be worked out
+# from the trades afterwards. The only clock reads are around the whole loop
+# and around each trade, so the offers' time is what's left over and timing
+# doesn't slow down the draws
+def instrumented_period(book: TraderBook, draws: PeriodDraws, timeout: float|None = None, max_steps: int = 100_000, period: int = 0, mix: StrategyMix|None = None) -> tuple[Trades, str, PeriodStats]:
+    stats = PeriodStats(period=period)
+    trades, reason = run_period(book, draws, timeout, max_steps, stats, mix)
+
+    last_trade_step = 0
+    for step in trades.step:
+        gap = step - last_trade_step
+        last_trade_step = step
+        bucket = gap.bit_length() - 1
+        if bucket >= len(stats.gap_histogram):
+            stats.gap_histogram += [0] * (bucket + 1 - len(stats.gap_histogram))
+        stats.gap_histogram[bucket] += 1
+    stats.idle_at_end = stats.draws - last_trade_step
+    return trades, reason, stats
+
+
+# Collects a `PeriodStats` for every period of every market it's given to
+# (`market.market(..., instrument=Instrumentation())`) and calls its hooks
+# around every period. A hook is anything with `period_started(period)` and
+# `period_finished(period, stats)`, e.g. a `ProfileHook` or something that
+# starts and stops a sampling profiler. Hooks run in the same thread as the
+# period, so they can't be used when the periods run on a pool
+class Instrumentation:
+    def __init__(self, hooks: tuple = ()):
+        self.hooks = list(hooks)
+        self.periods = []
+
+    def run_period(self, period: int, book: TraderBook, draws: PeriodDraws, timeout: float|None = None, max_steps: int = 100_000, mix: StrategyMix|None = None) -> tuple[Trades, str]:
+        for hook in self.hooks:
+            hook.period_started(period)
+        trades, reason, stats = instrumented_period(book, draws, timeout, max_steps, period, mix)
+        self.record(stats)
+        return trades, reason
+
+    def record(self, stats: PeriodStats):
+        self.periods.append(stats)
+        for hook in self.hooks:
+            hook.period_finished(stats.period, stats)
+
+    # Totals over every period so far
+    def summary(self) -> dict:
+        totals = {
+            'periods': len(self.periods),
+            'draws': 0, 'improving': 0, 'trades': 0, 'removals': 0, 'idle_at_end': 0,
+            'reset_seconds': 0.0, 'offer_seconds': 0.0, 'trade_seconds': 0.0,
+        }
+        gap_histogram = []
+        reasons = {}
+        for stats in self.periods:
+            for key in totals:
+                if key != 'periods':
+                    totals[key] += getattr(stats, key)
+            gap_histogram += [0] * (len(stats.gap_histogram) - len(gap_histogram))
+            for bucket, count in enumerate(stats.gap_histogram):
+                gap_histogram[bucket] += count
+            reasons[stats.reason] = reasons.get(stats.reason, 0) + 1
+
+        totals['improving_rate'] = totals['improving'] / totals['draws'] if totals['draws'] else 0.0
+        totals['draws_per_trade'] = totals['draws'] / totals['trades'] if totals['trades'] else 0.0
+        totals['gap_histogram'] = gap_histogram
+        totals['reasons'] = reasons
+        return totals
+
+    # One flat dict per period with only numbers and strings (histogram
+    # buckets become `gaps_<low>_<high>`), the shape most metrics pipelines
+    # take as is
+    def records(self) -> list[dict]:
+        rows = []
+        for stats in self.periods:
+            row = asdict(stats)
+            for bucket, count in enumerate(row.pop('gap_histogram')):
+                row[f"gaps_{2**bucket}_{2**(bucket+1) - 1}"] = count
+            rows.append(row)
+        return rows
+
+    # JSON lines, one record per period
+    def write_json(self, path: str):
+        with open(path, 'w') as f:
+            for row in self.records():
+                f.write(json.dumps(row) + '\n')
+
+
+# Runs cProfile over every period and nothing in between
+class ProfileHook:
+    def __init__(self):
+        self.profile = cProfile.Profile()
+
+    def period_started(self, period: int):
+        self.profile.enable()
+
+    def period_finished(self, period: int, stats: PeriodStats):
+        self.profile.disable()
+
+    def stats(self, sort: str = 'cumulative') -> pstats.Stats:
+        return pstats.Stats(self.profile).sort_stats(sort)
@@ -0,0 +1,248 @@
+import json
+import os
+from array import array
+import numpy as np
+
+# Reasons a trading period can end, these get recorded in the ledger
+EXHAUSTED = "Buyers/Sellers exhausted their supports"
+NO_GAINS = "No gains from trade left"
+OUT_OF_STEPS = "Step budget used up"
+TIMED_OUT = "Timed out"
+
+# Columns of a trade as they come out of `market.run_period()` (the period
+# gets added by the ledger) and the type each one is stored as
+COLUMNS = {
+    'period': np.int32,
+    'step': np.int64,
+    'bid': np.int64,
+    'ask': np.int64,
+    'price': np.int64,
+    'bidder': np.int32,
+    'seller': np.int32,
+    'bidder_profit': np.int64,
+    'seller_profit': np.int64,
+}
+TRADE_COLUMNS = list(COLUMNS)[1:]
+META = 'meta.json'
+
+# Ledgers get a stream of trades from the market one period at a time:
+# `start(schedule)`, then `write_period(period, trades, reason)` for every
+# period in order as soon as it's done, then `close()`
+
+
+# One period's trades, written straight into a typed `array` per column of
+# `TRADE_COLUMNS` (e.g. `trades.price`) while the period runs, so ledgers
+# can take whole columns. Iterating gives the trades as tuples
+class Trades:
+    __slots__ = tuple(TRADE_COLUMNS)
+
+    def __init__(self):
+        for name in TRADE_COLUMNS:
+            setattr(self, name, array('q'))
+
+    # From columns of any integer type, e.g. a period of a `ColumnLedger`
+    @classmethod
+    def from_columns(cls, columns: dict) -> 'Trades':
+        trades = cls()
+        for name in TRADE_COLUMNS:
+            setattr(trades, name, array('q', np.asarray(columns[name], dtype=np.int64).tobytes()))
+        return trades
+
+    def add(self, step: int, bid: int, ask: int, price: int, bidder: int, seller: int, bidder_profit: int, seller_profit: int):
+        self.step.append(step)
+        self.bid.append(bid)
+        self.ask.append(ask)
+        self.price.append(price)
+        self.bidder.append(bidder)
+        self.seller.append(seller)
+        self.bidder_profit.append(bidder_profit)
+        self.seller_profit.append(seller_profit)
+
+    def __len__(self) -> int:
+        return len(self.step)
+
+    def __iter__(self):
+        return zip(*(getattr(self, name) for name in TRADE_COLUMNS))
+
+    # A column as a NumPy view, no copy
+    def column(self, name: str) -> np.ndarray:
+        return np.frombuffer(getattr(self, name), dtype=np.int64)
+
+
+# The old printed ledger
+class StdoutLedger:
+    def __init__(self, timeout: float|None = None):
+        self.timeout = timeout
+
+    def start(self, schedule):
+        self.schedule = schedule
+
+    def write_period(self, period: int, trades: Trades, reason: str):
+        names = self.schedule.names
+        print(f"Transaction ledger {period+1}:")
+        print("Bid\tBidder\tAsk\tSeller\tPrice\tBidder profit\tSeller profit")
+
+        traded = [0] * self.schedule.num_traders
+        profits = [0] * self.schedule.num_traders
+        for step, bid, ask, price, bidder, seller, bidder_profit, seller_profit in trades:
+            print(f"{bid:3}\t"
+                f"{names[bidder][:7]:^7}\t"
+                f"{ask:3}\t"
+                f"{names[seller][:7]:^7}\t"
+                f"{price:4}\t"
+                f"{bidder_profit:7}\t\t"
+                f"{seller_profit:7}"
+            )
+            for t, profit in ((bidder, bidder_profit), (seller, seller_profit)):
+                traded[t] += 1
+                profits[t] += profit
+                if traded[t] == self.schedule.lengths[t]:
+                    print(f"~~~{names[t]} was removed with profits={profits[t]}")
+
+        # Check why the auction finished
+        if reason == TIMED_OUT:
+            print(TimeoutError(f"{TIMED_OUT} at {self.timeout} seconds."))
+        else:
+            print(reason)
+
+    def close(self):
+        pass
+
+
+# Writes trades into preallocated typed arrays and appends them to one raw
+# binary file per column every `chunk_size` trades, so memory use stays flat
+# however long the market runs. `meta.json` gets written on close
+class LedgerWriter:
+    def __init__(self, path: str, chunk_size: int = 65536):
+        if chunk_size <= 0:
+            raise ValueError("chunk_size must be greater than 0")
+
+        self.path = path
+        self.chunk_size = chunk_size
+        self.chunk = {name: np.empty(chunk_size, dtype=dtype) for name, dtype in COLUMNS.items()}
+        self.filled = 0
+        self.rows = 0
+        self.reasons = []
+        self.names = []
+
+        os.makedirs(path, exist_ok=True)
+        # Start from empty column files
+        for name in COLUMNS:
+            open(os.path.join(path, f"{name}.bin"), 'wb').close()
+
+    def start(self, schedule):
+        self.names = list(schedule.names)
+
+    def write_period(self, period: int, trades: Trades, reason: str):
+        self.reasons.append(reason)
+        columns = {name: trades.column(name) for name in TRADE_COLUMNS}
+
+        done = 0
+        while done < len(trades):
+            take = min(self.chunk_size - self.filled, len(trades) - done)
+            section = slice(self.filled, self.filled + take)
+            self.chunk['period'][section] = period
+            for name, column in columns.items():
+                self.chunk[name][section] = column[done:done + take]
+            self.filled += take
+            done += take
+            if self.filled == self.chunk_size:
+                self.flush()
+
+    def flush(self):
+        for name, column in self.chunk.items():
+            with open(os.path.join(self.path, f"{name}.bin"), 'ab') as f:
+                f.write(column[:self.filled].tobytes())
+        self.rows += self.filled
+        self.filled = 0
+
+    def close(self):
+        self.flush()
+        meta = {
+            'rows': self.rows,
+            'columns': {name: np.dtype(dtype).str for name, dtype in COLUMNS.items()},
+            'reasons': self.reasons,
+            'names': self.names,
+        }
+        with open(os.path.join(self.path, META), 'w') as f:
+            json.dump(meta, f)
+
+
+# What a finished ledger looks like to read: a dict of equally long columns
+# (also reachable as attributes, e.g. `ledger.price`), the reason every period
+# ended and the traders' names
+class ColumnLedger:
+    def __init__(self, columns: dict, reasons: list[str], names: list[str]):
+        self.columns = columns
+        self.reasons = reasons
+        self.names = names
+        self.periods = len(reasons)
+        self.rows = len(columns['period'])
+
+    def __getattr__(self, name):
+        try:
+            return self.__dict__['columns'][name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __len__(self) -> int:
+        return self.rows
+
+    # offsets[p]:offsets[p+1] are the rows of period p
+    def period_offsets(self) -> np.ndarray:
+        return np.searchsorted(self.columns['period'], np.arange(self.periods + 1))
+
+    # Prices in the same shape `market.market()` returns
+    def transaction_prices(self) -> list[list[int]]:
+        offsets = self.period_offsets()
+        return [self.price[offsets[p]:offsets[p+1]].tolist() for p in range(self.periods)]
+
+    # The `Trades` of every period as they came out of `market.run_period()`
+    # with the reason the period ended, for writing into other ledgers
+    def period_trades(self):
+        offsets = self.period_offsets()
+        for p in range(self.periods):
+            yield p, Trades.from_columns({name: self.columns[name][offsets[p]:offsets[p+1]] for name in TRADE_COLUMNS}), self.reasons[p]
+
+
+# Keeps the whole ledger in memory, `columns` get filled in on close
+class MemoryLedger(ColumnLedger):
+    def __init__(self):
+        super().__init__({name: np.zeros(0, dtype=dtype) for name, dtype in COLUMNS.items()}, [], [])
+        self.pending = []
+
+    def start(self, schedule):
+        self.names = list(schedule.names)
+
+    def write_period(self, period: int, trades: Trades, reason: str):
+        self.reasons.append(reason)
+        if len(trades) != 0:
+            self.pending.append((period, trades))
+
+    def close(self):
+        if self.pending:
+            self.columns['period'] = np.concatenate([np.full(len(trades), period) for period, trades in self.pending]).astype(COLUMNS['period'])
+            for name in TRADE_COLUMNS:
+                self.columns[name] = np.concatenate([trades.column(name) for _, trades in self.pending]).astype(COLUMNS[name])
+        self.pending = []
+        self.periods = len(self.reasons)
+        self.rows = len(self.columns['period'])
+
+
+# Memory-maps a ledger written by `LedgerWriter`, columns are read-only NumPy
+# arrays straight on top of the files (e.g. `reader.price`)
+class LedgerReader(ColumnLedger):
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, META)) as f:
+            meta = json.load(f)
+
+        rows = meta['rows']
+        columns = {}
+        for name, dtype in meta['columns'].items():
+            if rows == 0:
+                # Can't memory-map an empty file
+                columns[name] = np.zeros(0, dtype=dtype)
+            else:
+                columns[name] = np.memmap(os.path.join(path, f"{name}.bin"), dtype=dtype, mode='r', shape=(rows,))
+        super().__init__(columns, meta['reasons'], meta['names'])
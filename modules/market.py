@@ -1,173 +1,307 @@
-import random
+import threading
 import time
-import copy
-import modules.config as config
+import numpy as np
+from modules.config import Config
+from modules.book import Schedule, TraderBook
+import modules.population as population
+from modules.rng import PeriodDraws, Streams
+from modules.strategy import STRATEGIES, StrategyMix
+from modules.ledger import EXHAUSTED, NO_GAINS, OUT_OF_STEPS, TIMED_OUT, StdoutLedger, Trades
 
+# How many draws go by between looking at the clock when there's a timeout
+TIMEOUT_CHECK_EVERY = 1024
+
+# Only the schedule part of a trader (their values, role and strategy), none
+# of this changes while trading. Units traded, offers and profits are kept in
+# a `TraderBook` so they can be reset every period without copying anything.
+# Without a strategy (see `modules.strategy`) traders are ZI-C or ZI-U by
+# `constrained`, with one their strategy says whether they're constrained
 class Trader:
-    def __init__(self, name: str = '', bidder: bool = True, redemptions_or_costs: list[int] = [], constrained: bool = True):
+    __slots__ = ('name', 'constrained', 'is_bidder', 'redemptions_or_costs', 'strategy')
+
+    def __init__(self, name: str = '', bidder: bool = True, redemptions_or_costs: list[int] = [], constrained: bool = True, strategy: str|None = None):
+        if strategy == None:
+            strategy = 'zic' if constrained else 'ziu'
+        elif strategy not in STRATEGIES:
+            raise ValueError(f"Unknown strategy {strategy}, only: {', '.join(STRATEGIES)}")
         self.name = name
-        self.constrained = constrained
+        self.strategy = strategy
+        self.constrained = STRATEGIES[strategy].constrained
         self.is_bidder = bidder
 
         # If it's a bidder, then redemption values are decreasing for each additional unit
         if self.is_bidder:
-            self.redemptions_or_costs = sorted(redemptions_or_costs, reverse=True)
+            self.redemptions_or_costs = tuple(sorted(redemptions_or_costs, reverse=True))
         # If it's a seller, then costs are increasing for each additional unit
         else:
-            self.redemptions_or_costs = sorted(redemptions_or_costs)
+            self.redemptions_or_costs = tuple(sorted(redemptions_or_costs))
 
-        self.profits: list[int] = []
-        self.offer = self.gen_offer()
+# Makes the traders described by `config`, `constrained` overrides the config
+# (need for displaying 4 graphs) for ZI traders without `config.strategies`. Random schedules come from
+# `modules.population` with the population stream of `seed` (the config's
+# seed if not given), so the same seed always gives the same traders
+def gen_traders(config: Config, constrained: bool|None = None, seed: int|None = None) -> list[Trader]:
+    if constrained == None:
+        constrained = config.constrained
+    if seed == None:
+        seed = config.seed_entropy
 
+    schedule = population.gen_schedule(config, Streams(seed).population(), constrained)
+    values = schedule.value_matrix()
+    return [
+        Trader(name=name, bidder=bool(bidder), redemptions_or_costs=row[:length].tolist(), strategy=strategy)
+        for name, bidder, row, length, strategy in zip(schedule.names, schedule.is_bidder, values, schedule.lengths, schedule.strategies)
+    ]
 
-    # `len(self.profits)` is a good proxy for # of commodities bought/sold
-    def gen_offer(self):
-        # The redemption value/cost associated with the commodity traded
-        current_value = self.redemptions_or_costs[ len(self.profits) ]
 
-        if self.constrained and self.is_bidder:
-            self.offer = random.randrange(config.min_price, current_value + 1)
-        elif self.constrained and not self.is_bidder:
-            self.offer = random.randrange(current_value, config.max_price + 1)
-        else:
-            self.offer = random.randrange(config.min_price, config.max_price + 1)
-        return self.offer
+# Checks whether any more trades are possible between the active traders,
+# returns the reason the period should end or None if it should keep going
+def trading_over(book: TraderBook) -> str|None:
+    if book.num_bidders == 0 or book.num_sellers == 0:
+        return EXHAUSTED
+    # Best remaining redemption value against the cheapest remaining cost (or
+    # the price limits for unconstrained traders)
+    if book.best_bid_limit() < book.best_ask_limit():
+        return NO_GAINS
+    return None
 
-    def transact(self, price):
-        # The redemption value/cost associated with the commodity traded
-        current_value = self.redemptions_or_costs[ len(self.profits) ]
 
-        if self.is_bidder:
-            self.profits.append(current_value - price)
-        else:
-            self.profits.append(price - current_value)
-        return self.profits
-
-# All the other parameters get handled by the config file
-# Need for displaying 4 graphs
-def gen_traders(constrained: bool) -> list[Trader]:
-    # Makes the traders
-    traders = []
-    # Bidders
-    for _ in range(config.num_traders//2):
-        # If no redemptions are given, we can just make them up
-        if config.redemption_values == None:
-            redemption_values = [random.randint(config.min_price, config.max_price) for _ in range(config.num_commodities)]
-        else:
-            redemption_values = config.redemption_values
-        
-        t = Trader(
-            name=f"b{_}",
-            bidder=True,
-            redemptions_or_costs=redemption_values,
-            constrained=constrained)
-        traders.append(t)
-
-    # Sellers
-    for _ in range(config.num_traders//2):
-        # If no costs are given, we can just make them up
-        if config.costs == None:
-            costs = [random.randint(config.min_price, config.max_price) for _ in range(config.num_commodities)]
+# Runs one trading period on `book` (which gets reset first) with the
+# period's own random numbers (see `modules.rng`): who quotes comes from the
+# period's stream and every offer from the quoting trader's own stream.
+# Returns the trades (step, bid, ask, price, bidder, seller, bidder profit,
+# seller profit, as the typed columns of a `ledger.Trades`) and the reason
+# the period ended. Offers are the ZI-C/ZI-U ones of `modules.strategy`
+# inlined, unless `mix` (session 0 of a `StrategyMix`) has other strategies.
+# Then those make the offers and the ones that learn get told about every
+# shout before it trades. The offer numbers are the same either way, so
+# ZI-C/ZI-U traders in a mix make the same offers. With `stats` (an
+# `instrument.PeriodStats`) it also fills in the draws, improving offers,
+# removals and where the time went, the clock only gets read then
+def run_period(book: TraderBook, draws: PeriodDraws, timeout: float|None = None, max_steps: int = 100_000, stats=None, mix: StrategyMix|None = None) -> tuple[Trades, str]:
+    if stats != None:
+        clock = time.perf_counter
+        start = clock()
+    book.reset()
+    if stats != None:
+        stats.reset_seconds = clock() - start
+        trade_seconds = 0.0
+    min_price, max_price = book.schedule.min_price, book.schedule.max_price
+    values, width = book.values, book.width
+    traded, active, offers = book.traded, book.active, book.offers
+    picks, trader_offers = draws.picks, draws.offers
+    is_bidder, constrained, lengths = book.is_bidder, book.constrained, book.lengths
+    traders_at_start = book.num_active
+
+    strategic = mix != None and not mix.zero_intelligence
+    if strategic:
+        by_trader = mix.by_trader
+    learns = strategic and len(mix.learners) > 0
+    if learns:
+        # What the learners get told about every trader: the value of their
+        # current unit and whether they have any left. Only the two traders
+        # in a trade ever change
+        current = book.schedule.value_matrix()[:, 0].copy()
+        alive = np.frombuffer(lengths, dtype=np.int64) > 0
+
+    # Initializing these values
+    bid = min_price - 1 # All bids will be higher than this
+    ask = max_price + 1 # All asks will be lower than this
+    price = 0
+    # Keep track of trades in this period
+    trades = Trades()
+    # Offers that replaced the standing bid/ask
+    improving = 0
+
+    if timeout:
+        deadline = time.monotonic() + timeout
+    steps = 0
+
+    if stats != None:
+        loop_start = clock()
+    # Checking if there's at least one bidder and at least one seller
+    # that could still trade with each other
+    reason = trading_over(book)
+    while reason == None:
+        if steps == max_steps:
+            reason = OUT_OF_STEPS
+            break
+        # Looking at the clock every draw is a waste
+        if timeout and steps % TIMEOUT_CHECK_EVERY == 0 and time.monotonic() >= deadline:
+            reason = TIMED_OUT
+            break
+        steps += 1
+
+        # Random draw, exhausted traders are already out of the pool
+        try:
+            pick = next(picks)
+        except StopIteration:
+            pick = draws.more_picks()
+            picks = draws.picks
+        trader = active[int(pick * book.num_active)]
+        try:
+            u = next(trader_offers[trader])
+        except StopIteration:
+            u = draws.more_offers(trader)
+
+        # Generate a new offer from the redemption value/cost of the
+        # trader's current unit, uniform over the trader's range
+        current_value = values[trader*width + traded[trader]]
+        bidding = is_bidder[trader]
+        if strategic:
+            offer = by_trader[trader].offer(0, trader, current_value, u)
+        elif bidding:
+            if constrained[trader]:
+                offer = min_price + int(u * (current_value - min_price + 1))
+            else:
+                offer = min_price + int(u * (max_price - min_price + 1))
+        elif constrained[trader]:
+            offer = current_value + int(u * (max_price - current_value + 1))
         else:
-            costs = config.costs
+            offer = min_price + int(u * (max_price - min_price + 1))
+        offers[trader] = offer
+
+        # Is the new offer better than the already-recorded one?
+        # If so, replace them
+        if bidding:
+            if offer > bid:
+                bid = offer
+                price = ask
+                last_bidder = trader
+                improving += 1
+        elif offer < ask:
+            ask = offer
+            price = bid
+            last_seller = trader
+            improving += 1
+
+        if learns:
+            mix.observe_one(0, offer, bool(bidding), bid >= ask, price, current, alive)
 
-        t = Trader(
-            name=f"s{_}",
-            bidder=False,
-            redemptions_or_costs=costs,
-            constrained=constrained)
+        # Check if offers cross
+        if bid >= ask:
+            if stats != None:
+                trade_start = clock()
+            bidder_profit = book.transact(last_bidder, price)
+            seller_profit = book.transact(last_seller, price)
+            trades.add(steps, bid, ask, price, last_bidder, last_seller, bidder_profit, seller_profit)
+            if learns:
+                for t in (last_bidder, last_seller):
+                    if traded[t] < lengths[t]:
+                        current[t] = values[t*width + traded[t]]
+                    else:
+                        alive[t] = False
 
-        traders.append(t)
+            # Re-initializing the values
+            bid = min_price - 1
+            ask = max_price + 1
+            price = 0
 
-    return traders
+            # Only a trade can change what's left to trade
+            reason = trading_over(book)
+            if stats != None:
+                trade_seconds += clock() - trade_start
 
+    if stats != None:
+        stats.offer_seconds = clock() - loop_start - trade_seconds
+        stats.trade_seconds = trade_seconds
+        stats.reason = reason
+        stats.draws = steps
+        stats.improving = improving
+        stats.trades = len(trades)
+        # Traders only ever leave the pool by trading their last unit
+        stats.removals = traders_at_start - book.num_active
+    return trades, reason
+
+
+# Every worker keeps one book and resets it for each period it runs
+_worker = threading.local()
+
+def _init_worker(schedule: Schedule):
+    _worker.book = TraderBook(schedule)
+
+# A period's random numbers only depend on the seed and the period, so it
+# gets the same draws whichever worker (or no worker) runs it
+def _pooled_period(args) -> tuple[Trades, str, object]:
+    period, seed, block, timeout, max_steps, instrumented = args
+    book = _worker.book
+    draws = Streams(seed).period_draws(period, book.schedule.num_traders, block=block)
+    if instrumented:
+        from modules.instrument import instrumented_period
+        return instrumented_period(book, draws, timeout, max_steps, period)
+    return (*run_period(book, draws, timeout, max_steps), None)
+
+
+# Runs `config.periods` periods with `traders`. `config.max_steps` is the
+# number of offer draws allowed in each period, which keeps seeded runs
+# reproducible, and `config.timeout` (in seconds) is only a safety limit.
+# Every period gets its own random streams derived from `seed` (the config's
+# seed if not given, see `modules.rng`), drawn `config.block_size` at a time,
+# so running the periods on a pool of `config.workers` ("process" or
+# "thread") gives the same prices as running them here. Every period's
+# trades also go to each of the `ledgers` (see `modules.ledger`) as soon as
+# the period is done, plus a printed one when `config.quiet` is off, and the
+# counters of every period to `instrument` (see `modules.instrument`).
+# Traders with strategies other than ZI-C/ZI-U run their periods here, one
+# after the other, since learning strategies carry what they learned into
+# the next period
+def market(traders: list[Trader], config: Config, seed: int|None = None, pool: str = "process", ledgers: tuple = (), instrument=None) -> list:
+    timeout, periods, quiet, max_steps, workers = config.timeout, config.periods, config.quiet, config.max_steps, config.workers
 
-def market(traders: list[Trader] = [], timeout: int = 30, periods: int = 1, quiet: bool = True) -> list:
     if traders == []:
         raise ValueError("Empty list")
+    if pool not in ("process", "thread"):
+        raise ValueError("pool can only be either 'process' or 'thread'")
+    if quiet != True:
+        ledgers = (*ledgers, StdoutLedger(timeout))
 
-    # This is eventually the output of this function
-    transaction_prices = []
+    # Traders never get changed, all the trading happens in a book which
+    # gets reset in place every period
+    schedule = Schedule(traders, config.min_price, config.max_price)
+    if seed == None:
+        seed = config.seed_entropy
+    streams = Streams(seed)
+    n = schedule.num_traders
+    mix = StrategyMix(schedule.strategies, schedule.is_bidder, 1, config.min_price, config.max_price, np.random.default_rng(streams.learning()))
 
-    for p in range(periods):
-        # I hate mutability
-        # Need to do this in order to not keep using the original traders over and over again
-        list_of_traders = copy.deepcopy(traders)
-
-        if quiet != True:
-            print(f"Transaction ledger {p+1}:")
-            print("Bid\tBidder\tAsk\tSeller\tPrice\tBidder profit\tSeller profit")
-
-        # Initializing these values
-        bid = config.min_price - 1 # All bids will be higher than this
-        ask = config.max_price + 1 # All asks will be lower than this
-        price = 0
-        # Keep track of prices in each period
-        period_prices = []
-
-        start = time.time()
-
-        # Checking if there's at least one bidder and at least one seller
-        bidders =  [i.is_bidder for i in list_of_traders]
-        while (True in bidders and False in bidders) and (time.time() < start + timeout):
-
-            # Random draw
-            trader = random.choice(list_of_traders)
-
-            # Check if trader has exhausted their support
-            if len(trader.profits) == len(trader.redemptions_or_costs):
-                # Removes the specific trader from the pool
-                list_of_traders.remove(trader)
-                if quiet != True:
-                    print(f"~~~{trader.name} was removed with {trader.profits=}")
-                # There is one less bidder (or seller) in the pool
-                bidders.pop(trader.is_bidder)
-                continue
-
-            # Generate a new offer
-            trader.gen_offer()
-
-            # Is the new offer better than the already-recorded one?
-            # If so, replace them
-            if trader.is_bidder:
-                if trader.offer > bid:
-                    bid = trader.offer
-                    price = ask
-                    last_bidder = trader
-            else:
-                if trader.offer < ask:
-                    ask = trader.offer
-                    price = bid
-                    last_seller = trader
-
-            # Check if offers cross
-            if bid >= ask:
-                last_bidder.transact(price)
-                last_seller.transact(price)
-                period_prices.append(price)
-
-                if quiet != True:
-                    print(f"{bid:3}\t"
-                        f"{last_bidder.name[:7]:^7}\t"
-                        f"{ask:3}\t"
-                        f"{last_seller.name[:7]:^7}\t"
-                        f"{price:4}\t"
-                        f"{last_bidder.profits[-1]:7}\t\t"
-                        f"{last_seller.profits[-1]:7}"
-                    )
-
-                # Re-initializing the values
-                bid = config.min_price - 1
-                ask = config.max_price + 1
-                price = 0
-            
-        # Check why the auction finished
-        if quiet != True:
-            if time.time() > start + timeout:
-                print(TimeoutError(f"Timed out at {timeout} seconds."))
+    pooled = workers > 1 and periods > 1 and mix.zero_intelligence
+    if pooled and instrument != None and instrument.hooks:
+        raise ValueError("Instrumentation hooks only work with workers = 1")
+
+    # The trades and end reason of every period in order, each as soon as
+    # it's done
+    def run_periods():
+        if pooled:
+            # Only pay for importing this when there's a pool to run
+            from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+            Executor = ProcessPoolExecutor if pool == "process" else ThreadPoolExecutor
+            with Executor(max_workers=min(workers, periods), initializer=_init_worker, initargs=(schedule,)) as executor:
+                # map() hands the periods back in order
+                for trades, reason, stats in executor.map(_pooled_period, [(p, seed, config.block_size, timeout, max_steps, instrument != None) for p in range(periods)]):
+                    if stats != None:
+                        instrument.record(stats)
+                    yield trades, reason
+            return
+
+        book = TraderBook(schedule)
+        for p in range(periods):
+            draws = streams.period_draws(p, n, block=config.block_size)
+            if instrument != None:
+                yield instrument.run_period(p, book, draws, timeout, max_steps, mix)
             else:
-                print("Buyers/Sellers exhausted their supports")
+                yield run_period(book, draws, timeout, max_steps, mix=mix)
 
+    # This is eventually the output of this function
+    transaction_prices = []
+
+    for ledger in ledgers:
+        ledger.start(schedule)
+    for p, (trades, reason) in enumerate(run_periods()):
+        for ledger in ledgers:
+            ledger.write_period(p, trades, reason)
         # This is so if all the bidders and sellers are exhausted prices still get recorded
-        transaction_prices.append(period_prices)
+        transaction_prices.append(trades.price.tolist())
+    for ledger in ledgers:
+        ledger.close()
+
     return transaction_prices
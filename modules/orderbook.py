@@ -0,0 +1,279 @@
+import heapq
+import time
+import numpy as np
+from modules.book import Schedule, TraderBook
+from modules.config import Config
+from modules.ledger import OUT_OF_STEPS, TIMED_OUT, StdoutLedger, Trades
+from modules.market import Trader, trading_over
+from modules.rng import DEFAULT_BLOCK, Streams
+
+# A continuous double auction: unlike `market.market()`, where only the best
+# bid/ask stand and everything starts over after a trade, every order stays in
+# the book until it trades or its trader quotes again. Traders make offers
+# with the same ZI rules (uniform in their constrained or unconstrained range
+# for their current unit), and an order that crosses the best order on the
+# other side trades with it at the resting order's price.
+
+# Orders handled together by `run_cda_period()`, see there
+MIN_CHUNK = 16
+MAX_CHUNK = 4096
+# First block of random numbers drawn, they double up to `block`
+MIN_BLOCK = 1024
+
+
+# Resting orders on both sides with price-time priority. Entries are
+# (-price, seq, trader) for bids and (price, seq, trader) for asks, `seq`
+# being when the order came in. Every trader has at most one live order, the
+# seq of which is in `live` (-1 for none), so replacing or cancelling an order
+# only changes `live` and the stale entry gets thrown out when it gets to the
+# top of its heap (or when the heaps get compacted)
+class OrderBook:
+    def __init__(self, num_traders: int):
+        self.bids = []
+        self.asks = []
+        self.live = [-1] * num_traders
+
+    def clear(self):
+        self.bids.clear()
+        self.asks.clear()
+        self.live[:] = [-1] * len(self.live)
+
+    def _top(self, heap: list):
+        live = self.live
+        while heap and live[heap[0][2]] != heap[0][1]:
+            heapq.heappop(heap)
+        return heap[0] if heap else None
+
+    # (price, trader) of the best live order on a side, None when it's empty
+    def best_bid(self) -> tuple[int, int]|None:
+        top = self._top(self.bids)
+        return None if top == None else (-top[0], top[2])
+
+    def best_ask(self) -> tuple[int, int]|None:
+        top = self._top(self.asks)
+        return None if top == None else (top[0], top[2])
+
+    def cancel(self, trader: int):
+        self.live[trader] = -1
+
+    # Live orders on each side
+    def depth(self) -> tuple[int, int]:
+        live = self.live
+        bids = sum(1 for _, seq, trader in self.bids if live[trader] == seq)
+        asks = sum(1 for _, seq, trader in self.asks if live[trader] == seq)
+        return bids, asks
+
+    # Drops every stale entry, only worth it once they far outnumber the live
+    # ones
+    def compact(self):
+        live = self.live
+        for heap in (self.bids, self.asks):
+            heap[:] = [entry for entry in heap if live[entry[2]] == entry[1]]
+            heapq.heapify(heap)
+
+
+# Runs one continuous double auction period on `book` (which gets reset
+# first). Same stopping rules as `market.run_period()`: the period ends when
+# no active bidder and seller could still trade with each other, after
+# `max_steps` orders or after `timeout` seconds (checked every chunk of
+# orders). Returns the trades as a `ledger.Trades` of (step, bid, ask,
+# price, bidder, seller, bidder profit, seller profit) with the bid and ask
+# that crossed, so they go into the same ledgers.
+#
+# This is the batch mode: random numbers come from NumPy in blocks of up to
+# `block` orders (two per order: who quotes and where in their range) and the
+# orders get handled a chunk at a time. Who quotes and what they offer is worked out
+# with NumPy for the whole chunk. Until something trades, the best ask can
+# only get lower by new asks coming in (cancelling only makes it higher), so a
+# bid below the best ask at the start of the chunk and below every ask before
+# it in the chunk can't trade and just rests, and the same goes for asks.
+# Of a run of orders like that only the last one of each trader stays live,
+# so only those go into the heaps, and only the orders that might cross get
+# matched one at a time. A trade changes the traders' ranges and maybe who's
+# active, so the chunk ends there. Chunks grow while nothing trades and shrink
+# when trades keep cutting them short, down to `MIN_CHUNK` orders, which go in
+# one at a time without NumPy. The numbers are used in order, so the results
+# don't depend on `block`
+def run_cda_period(book: TraderBook, orders: OrderBook, rng: np.random.Generator, timeout: float|None = None, max_steps: int = 100_000, block: int = DEFAULT_BLOCK) -> tuple[Trades, str]:
+    if block <= 0:
+        raise ValueError("block must be greater than 0")
+
+    book.reset()
+    orders.clear()
+    n = book.schedule.num_traders
+    min_price, max_price = book.schedule.min_price, book.schedule.max_price
+    bids, asks, live = orders.bids, orders.asks, orders.live
+    heappush, heappop = heapq.heappush, heapq.heappop
+    # Compact once there are this many entries in the heaps
+    compact_at = 4 * n + 1024
+
+    active = np.frombuffer(book.active, dtype=np.int64)
+    is_bidder = np.frombuffer(book.is_bidder, dtype=np.int8).astype(bool)
+    # Lowest offer and number of possible offers of every trader, these only
+    # change when the trader trades. Kept as lists too for short chunks
+    low = np.full(n, min_price, dtype=np.int64)
+    size = np.full(n, max_price - min_price + 1, dtype=np.int64)
+    low_list, size_list = low.tolist(), size.tolist()
+    def update_range(i):
+        if book.constrained[i] and book.traded[i] < book.lengths[i]:
+            value = book.current_value(i)
+            low[i] = low_list[i] = min_price if book.is_bidder[i] else value
+            size[i] = size_list[i] = (value if book.is_bidder[i] else max_price) - low_list[i] + 1
+    for i in range(n):
+        update_range(i)
+
+    # Puts an order that might cross in the book, returns the trade if it
+    # crossed the best order on the other side (which trades at its price)
+    def submit(trader, offer, bidding, step):
+        if bidding:
+            while asks and live[asks[0][2]] != asks[0][1]:
+                heappop(asks)
+            if not asks or asks[0][0] > offer:
+                live[trader] = step
+                heappush(bids, (-offer, step, trader))
+                return None
+            price, _, seller = heappop(asks)
+            bidder, bid, ask = trader, offer, price
+        else:
+            while bids and live[bids[0][2]] != bids[0][1]:
+                heappop(bids)
+            if not bids or -bids[0][0] < offer:
+                live[trader] = step
+                heappush(asks, (offer, step, trader))
+                return None
+            price, _, bidder = heappop(bids)
+            price = -price
+            seller, bid, ask = trader, price, offer
+
+        live[bidder] = -1
+        live[seller] = -1
+        bidder_profit = book.transact(bidder, price)
+        seller_profit = book.transact(seller, price)
+        update_range(bidder)
+        update_range(seller)
+        return (step, bid, ask, price, bidder, seller, bidder_profit, seller_profit)
+
+    trades = Trades()
+    if timeout:
+        deadline = time.monotonic() + timeout
+    steps = 0
+    chunk = MIN_CHUNK
+    never = 2 * (max_price + 1)
+    # Blocks start small so short periods don't draw numbers they never use
+    size_of_block = min(block, MIN_BLOCK)
+
+    reason = trading_over(book)
+    while reason == None and steps < max_steps:
+        count = min(size_of_block, max_steps - steps)
+        size_of_block = min(size_of_block * 2, block)
+        draws = rng.random(2 * count)
+        picks, wheres = draws[0::2], draws[1::2]
+        picks_list, wheres_list = picks.tolist(), wheres.tolist()
+        first = steps
+        while reason == None and steps - first < count:
+            if timeout and time.monotonic() >= deadline:
+                reason = TIMED_OUT
+                break
+
+            start = steps - first
+            end = min(start + chunk, count)
+            traded = False
+            if chunk == MIN_CHUNK:
+                # Trades keep coming, so NumPy isn't worth it: every order
+                # goes in on its own
+                num_active = book.num_active
+                for i in range(start, end):
+                    trader = book.active[int(picks_list[i] * num_active)]
+                    steps += 1
+                    trade = submit(trader, low_list[trader] + int(wheres_list[i] * size_list[trader]), book.is_bidder[trader], steps)
+                    if trade != None:
+                        trades.add(*trade)
+                        reason = trading_over(book)
+                        traded = True
+                        break
+            else:
+                traders = active[(picks[start:end] * book.num_active).astype(np.int64)]
+                offers = low[traders] + (wheres[start:end] * size[traders]).astype(np.int64)
+                bidding = is_bidder[traders]
+
+                # Best live orders now
+                while asks and live[asks[0][2]] != asks[0][1]:
+                    heappop(asks)
+                while bids and live[bids[0][2]] != bids[0][1]:
+                    heappop(bids)
+                best_ask = asks[0][0] if asks else never
+                best_bid = -bids[0][0] if bids else -never
+
+                # Best the other side could be when each order comes in
+                ask_bound = np.minimum.accumulate(np.concatenate([[best_ask], np.where(bidding, never, offers)[:-1]]))
+                bid_bound = np.maximum.accumulate(np.concatenate([[best_bid], np.where(bidding, offers, -never)[:-1]]))
+                might_cross = np.flatnonzero(np.where(bidding, offers >= ask_bound, offers <= bid_bound)).tolist()
+                traders_list, offers_list, bidding_list = traders.tolist(), offers.tolist(), bidding.tolist()
+
+                done = 0
+                for i in might_cross + [len(traders_list)]:
+                    # Everything up to the next order that might cross just
+                    # rests, and only each trader's last order there stays live
+                    if i > done:
+                        base = steps - done + 1
+                        for trader, j in dict(zip(traders_list[done:i], range(done, i))).items():
+                            live[trader] = base + j
+                            if bidding_list[j]:
+                                heappush(bids, (-offers_list[j], base + j, trader))
+                            else:
+                                heappush(asks, (offers_list[j], base + j, trader))
+                        steps += i - done
+                    if i == len(traders_list):
+                        break
+
+                    steps += 1
+                    done = i + 1
+                    trade = submit(traders_list[i], offers_list[i], bidding_list[i], steps)
+                    if trade != None:
+                        trades.add(*trade)
+                        reason = trading_over(book)
+                        traded = True
+                        break
+
+            chunk = max(chunk // 2, MIN_CHUNK) if traded else min(chunk * 2, MAX_CHUNK)
+            if len(bids) + len(asks) > compact_at:
+                orders.compact()
+
+    if reason == None:
+        reason = OUT_OF_STEPS
+    return trades, reason
+
+
+# Same as `market.market()` but every period is a continuous double auction
+# (see `run_cda_period()`). Every period gets its own NumPy random stream from
+# `seed` (the config's seed if not given, see `modules.rng`) and the trades go
+# to the same `ledgers`, so `modules.analytics` works on the results too.
+# Offers are worked out a chunk at a time from one stream, so unlike
+# `market.market()` traders don't have streams of their own here
+def cda_market(traders: list[Trader], config: Config, seed: int|None = None, ledgers: tuple = ()) -> list:
+    if traders == []:
+        raise ValueError("Empty list")
+    if any(t.strategy not in ('zic', 'ziu') for t in traders):
+        raise ValueError("The continuous double auction only runs ZI-C and ZI-U traders")
+    if config.quiet != True:
+        ledgers = (*ledgers, StdoutLedger(config.timeout))
+
+    schedule = Schedule(traders, config.min_price, config.max_price)
+    if seed == None:
+        seed = config.seed_entropy
+    streams = Streams(seed)
+    book = TraderBook(schedule)
+    orders = OrderBook(schedule.num_traders)
+
+    for ledger in ledgers:
+        ledger.start(schedule)
+    transaction_prices = []
+    for p in range(config.periods):
+        trades, reason = run_cda_period(book, orders, np.random.default_rng(streams.period(p)), config.timeout, config.max_steps, config.block_size)
+        for ledger in ledgers:
+            ledger.write_period(p, trades, reason)
+        transaction_prices.append(trades.price.tolist())
+    for ledger in ledgers:
+        ledger.close()
+
+    return transaction_prices
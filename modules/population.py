@@ -0,0 +1,158 @@
+import numpy as np
+from modules.book import Schedule
+from modules.config import Config
+
+# Makes whole populations of traders as arrays: every random schedule is drawn
+# in one NumPy call, sorted in place and handed back as a traders x units
+# matrix (or sessions x traders x units) or straight as a `Schedule`, so
+# nothing ever makes a `Trader` per trader or a list per schedule. Bidders
+# come first, then sellers, and like `Trader` bidders' values go from highest
+# to lowest and sellers' from lowest to highest.
+#
+# Where the values come from, most specific first: `config.trader_schedules`
+# (every trader's own schedule), `config.costs`/`config.redemption_values`
+# (every seller/bidder gets the same one) or `config.distribution` with
+# `config.distribution_params`.
+
+
+# Every distribution takes the generator, the shape to draw, the price limits
+# and its own settings (all optional) and returns int64 values within the
+# limits, in any order
+
+# Every value equally likely, what `market.gen_traders()` always did
+def uniform(rng: np.random.Generator, shape: tuple, min_price: int, max_price: int) -> np.ndarray:
+    return rng.integers(min_price, max_price + 1, size=shape)
+
+# Step schedules like the paper's Fig 3: `width` units in a row share a value
+def step(rng: np.random.Generator, shape: tuple, min_price: int, max_price: int, width: int = 3) -> np.ndarray:
+    width = int(width)
+    if width <= 0:
+        raise ValueError("width must be greater than 0")
+    units = shape[-1]
+    levels = rng.integers(min_price, max_price + 1, size=shape[:-1] + (-(-units // width),))
+    return np.repeat(levels, width, axis=-1)[..., :units]
+
+# Bell-shaped around `mean` (the middle of the price range by default) with
+# standard deviation `sd` (a sixth of the range), rounded and clipped to the
+# price limits
+def normal(rng: np.random.Generator, shape: tuple, min_price: int, max_price: int, mean: float|None = None, sd: float|None = None) -> np.ndarray:
+    if mean == None:
+        mean = (min_price + max_price) / 2
+    if sd == None:
+        sd = (max_price - min_price) / 6
+    if sd < 0:
+        raise ValueError("sd must be 0 or greater")
+    values = rng.normal(mean, sd, size=shape)
+    np.rint(values, out=values)
+    np.clip(values, min_price, max_price, out=values)
+    return values.astype(np.int64)
+
+# One uniform schedule shared by everyone (per session), with every trader's
+# copy shifted up or down by a whole amount of at most `spread` (a tenth of
+# the price range by default), clipped to the price limits
+def shifted(rng: np.random.Generator, shape: tuple, min_price: int, max_price: int, spread: int|None = None) -> np.ndarray:
+    if spread == None:
+        spread = (max_price - min_price) // 10
+    spread = int(spread)
+    if spread < 0:
+        raise ValueError("spread must be 0 or greater")
+    base = rng.integers(min_price, max_price + 1, size=shape[:-2] + (1, shape[-1]))
+    shifts = rng.integers(-spread, spread + 1, size=shape[:-1] + (1,))
+    values = base + shifts
+    np.clip(values, min_price, max_price, out=values)
+    return values
+
+DISTRIBUTIONS = {
+    'uniform': uniform,
+    'step': step,
+    'normal': normal,
+    'shifted': shifted,
+}
+
+
+# Sorts every row of `values` in place (last axis), bidders' rows (the first
+# `bidders` of the second to last axis) from highest to lowest. Bidders get
+# flipped around zero so one ascending sort does both without copying
+def sort_rows(values: np.ndarray, bidders: int):
+    np.negative(values[..., :bidders, :], out=values[..., :bidders, :])
+    values.sort(axis=-1)
+    np.negative(values[..., :bidders, :], out=values[..., :bidders, :])
+
+
+# Bidders first, then sellers
+def roles(config: Config) -> np.ndarray:
+    if config.trader_schedules:
+        bidders = sum(1 for bidder, _ in config.trader_schedules if bidder)
+        return np.arange(config.num_traders) < bidders
+    return np.arange(config.num_traders) < config.num_traders // 2
+
+def names(config: Config) -> list[str]:
+    is_bidder = roles(config)
+    bidders = int(is_bidder.sum())
+    return [f"b{i}" for i in range(bidders)] + [f"s{i}" for i in range(len(is_bidder) - bidders)]
+
+
+# Every trader's strategy: `config.strategies` taken in turn by the bidders
+# and by the sellers, or ZI-C/ZI-U by `constrained` (the config's by default)
+# without any
+def strategies(config: Config, constrained: bool|None = None) -> list[str]:
+    if not config.strategies:
+        if constrained == None:
+            constrained = config.constrained
+        return ['zic' if constrained else 'ziu'] * config.num_traders
+    bidders = int(roles(config).sum())
+    cycle = config.strategies
+    return [cycle[i % len(cycle)] for i in range(bidders)] + [cycle[i % len(cycle)] for i in range(config.num_traders - bidders)]
+
+
+# Traders x units values of the explicit schedules and how many units each
+# trader really has, or None for random ones. Shorter schedules get padded
+# with values nobody could trade at (below `min_price` for bidders, above
+# `max_price` for sellers), so the analytics can use the matrix as it is
+def explicit_values(config: Config) -> tuple[np.ndarray, np.ndarray]|None:
+    half = config.num_traders // 2
+    if config.trader_schedules:
+        schedules = [values for bidder, values in config.trader_schedules if bidder]
+        bidders = len(schedules)
+        schedules += [values for bidder, values in config.trader_schedules if not bidder]
+    elif config.costs != None:
+        schedules = [config.redemption_values] * half + [config.costs] * half
+        bidders = half
+    else:
+        return None
+
+    lengths = np.array([len(values) for values in schedules], dtype=np.int64)
+    values = np.full((len(schedules), lengths.max()), config.min_price - 1, dtype=np.int64)
+    values[bidders:] = config.max_price + 1
+    for i, row in enumerate(schedules):
+        values[i, :len(row)] = row
+    # Already sorted by `Config`
+    return values, lengths
+
+
+# Every trader's values, traders x `config.num_commodities`, or `sessions` x
+# traders x units with a different population for every session. Explicit
+# schedules are the same for every session, so they come back as 1 x traders
+# x units when `sessions` is given. `seed` is anything `np.random.default_rng()`
+# takes (a Generator gets used as it is), None for the config's seed
+def population_values(config: Config, seed=None, sessions: int|None = None) -> np.ndarray:
+    explicit = explicit_values(config)
+    if explicit != None:
+        values = explicit[0]
+        return values if sessions == None else values[None]
+
+    rng = np.random.default_rng(config.seed_entropy if seed is None else seed)
+    shape = (config.num_traders, config.num_commodities)
+    if sessions != None:
+        shape = (sessions,) + shape
+    values = DISTRIBUTIONS[config.distribution](rng, shape, config.min_price, config.max_price, **dict(config.distribution_params))
+    sort_rows(values, config.num_traders // 2)
+    return values
+
+
+# The config's population as a `Schedule`, `constrained` overrides the config
+# (see `strategies()`)
+def gen_schedule(config: Config, seed=None, constrained: bool|None = None) -> Schedule:
+    explicit = explicit_values(config)
+    values, lengths = explicit if explicit != None else (population_values(config, seed), None)
+    return Schedule.from_arrays(values, roles(config), None, config.min_price, config.max_price, names(config), lengths, strategies(config, constrained))
@@ -0,0 +1,221 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from PIL import Image
+# Only the object-oriented API with the Agg canvas, pyplot would pick a GUI
+# backend and keep every figure alive until it's closed
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import LineCollection
+from matplotlib.figure import Figure
+import modules.analytics as analytics
+from modules.book import Schedule
+from modules.config import Config
+from modules.rng import Streams
+
+FORMATS = ('png', 'svg')
+
+
+# Draws the same supply/demand and transaction price figure as
+# `graphs.plot_supply_demand_and_transactions()` straight into files. The
+# figure and its lines are made once, every `render()` only swaps the data in
+# and saves, so rendering thousands of markets doesn't rebuild any axes. It
+# never shows anything or blocks, and never changes its inputs.
+#
+# Most of drawing a figure is the axes, ticks and text, which only change with
+# the title and the limits. For PNGs, a bitmap of everything but the data is
+# kept for the last `backgrounds` different titles and limits, then the lines
+# get drawn on top of a copy of it. The x limit of the prices gets rounded up
+# to a multiple of 10 trades so markets of about the same length share one
+class FigureRenderer:
+    def __init__(self, width: float = 9.6, height: float = 4.8, dpi: int = 100, backgrounds: int = 16):
+        self.figure = Figure(figsize=(width, height), dpi=dpi, layout='constrained')
+        self.canvas = FigureCanvasAgg(self.figure)
+        self.title = self.figure.suptitle("")
+        self.laid_out = False
+        self.backgrounds = {}
+        self.max_backgrounds = backgrounds
+
+        schedules, transactions = self.figure.subplots(nrows=1, ncols=2, width_ratios=[1, 2])
+        self.schedules_ax, self.transactions_ax = schedules, transactions
+
+        schedules.set_title("Supply and Demand Schedules")
+        (self.supply,) = schedules.step([], [], color='blue')
+        (self.demand,) = schedules.step([], [], color='red')
+        # Both dashed equilibrium lines as one line: across at the price, then
+        # down at the quantity
+        (self.equilibrium_lines,) = schedules.plot([], [], color='black', linestyle='dashed')
+        schedules.set_box_aspect(1)
+
+        transactions.set_title("Transaction Prices")
+        (self.prices,) = transactions.plot([], [])
+        self.period_lines = LineCollection([], colors='black', linestyles='dashed')
+        transactions.add_collection(self.period_lines)
+        (self.equilibrium_price,) = transactions.plot([], [], color='black')
+        transactions.set_box_aspect(0.5)
+
+        # Artists that change with every market, in drawing order
+        self.data = [
+            (schedules, self.supply), (schedules, self.demand), (schedules, self.equilibrium_lines),
+            (transactions, self.prices), (transactions, self.period_lines), (transactions, self.equilibrium_price),
+        ]
+
+    # `prices` are all the transaction prices in order and `offsets` where
+    # every period starts (offsets[p]:offsets[p+1] is period p, like a ledger
+    # or one session of a `BatchResult`), leave them out for a single period
+    def render(self, path: str, costs, redemptions, prices, offsets=None, title: str = "", min_price: int|None = None, max_price: int|None = None) -> str:
+        costs = np.sort(np.asarray(costs))
+        redemptions = np.sort(np.asarray(redemptions))[::-1]
+        prices = np.asarray(prices)
+        quantity, low, high = analytics.equilibrium_of(tuple(costs.tolist()), tuple(redemptions.tolist()))
+        equilibrium_price = None if quantity == 0 else (low + high) / 2
+
+        if min_price == None:
+            min_price = min(costs.min(initial=np.inf), redemptions.min(initial=np.inf), prices.min(initial=np.inf))
+        if max_price == None:
+            max_price = max(costs.max(initial=-np.inf), redemptions.max(initial=-np.inf), prices.max(initial=-np.inf))
+        if not np.isfinite(min_price) or min_price == max_price:
+            min_price, max_price = 0, 1
+
+        # Same steps `graphs.plot_supply_demand()` draws: the first unit is
+        # repeated so the first step starts at 0
+        units = max(len(costs), len(redemptions), 1)
+        self.supply.set_data(np.arange(len(costs) + 1), np.concatenate([costs[:1], costs]))
+        self.demand.set_data(np.arange(len(redemptions) + 1), np.concatenate([redemptions[:1], redemptions]))
+        if equilibrium_price != None:
+            self.equilibrium_lines.set_data([0, quantity, quantity], [equilibrium_price, equilibrium_price, min_price])
+        else:
+            self.equilibrium_lines.set_data([], [])
+
+        trades = len(prices)
+        self.prices.set_data(np.arange(1, trades + 1), prices)
+        boundaries = [] if offsets is None else np.asarray(offsets)[1:-1]
+        self.period_lines.set_segments([[(x, min_price), (x, max_price)] for x in boundaries])
+        if equilibrium_price != None:
+            self.equilibrium_price.set_data([1, trades + 1], [equilibrium_price, equilibrium_price])
+        else:
+            self.equilibrium_price.set_data([], [])
+
+        limits = (title, units, float(min_price), float(max_price), max(-(-trades // 10) * 10, 10))
+        if path.endswith('.png'):
+            self._render_png(path, limits)
+        else:
+            self._set_limits(limits)
+            self.figure.savefig(path)
+        return path
+
+    def _set_limits(self, limits: tuple):
+        title, units, min_price, max_price, trades = limits
+        self.title.set_text(title)
+        self.schedules_ax.set_xlim(0, units)
+        self.schedules_ax.set_ylim(min_price, max_price)
+        self.transactions_ax.set_xlim(1, trades)
+        self.transactions_ax.set_ylim(min_price, max_price)
+
+    def _render_png(self, path: str, limits: tuple):
+        background = self.backgrounds.get(limits)
+        if background == None:
+            self._set_limits(limits)
+            # Animated artists get left out of a normal draw
+            for _, artist in self.data:
+                artist.set_animated(True)
+            self.canvas.draw()
+            for _, artist in self.data:
+                artist.set_animated(False)
+            # Tick labels barely change between markets, so the layout from
+            # the first one is kept instead of being worked out every time
+            if not self.laid_out:
+                self.figure.set_layout_engine('none')
+                self.laid_out = True
+
+            background = self.canvas.copy_from_bbox(self.figure.bbox)
+            if len(self.backgrounds) == self.max_backgrounds:
+                # Dicts keep insertion order, so this is the oldest one
+                del self.backgrounds[next(iter(self.backgrounds))]
+            self.backgrounds[limits] = background
+        else:
+            self._set_limits(limits)
+            self.canvas.restore_region(background)
+
+        for ax, artist in self.data:
+            ax.draw_artist(artist)
+        Image.frombuffer('RGBA', self.canvas.get_width_height(), self.canvas.buffer_rgba(), 'raw', 'RGBA', 0, 1).save(path)
+
+
+# Every worker process keeps one renderer for all the figures it draws
+_renderer = None
+
+def _init_renderer(size: tuple):
+    global _renderer
+    _renderer = FigureRenderer(*size)
+
+def _render(job: dict) -> str:
+    return _renderer.render(**job)
+
+
+# Renders every job (the keyword arguments of `FigureRenderer.render()`) over
+# a pool of `workers` processes, 0 for all cores and 1 to render them here.
+# Returns the paths in the same order as the jobs
+def render_figures(jobs: list[dict], workers: int = 0, size: tuple = (9.6, 4.8, 100)) -> list[str]:
+    if len(jobs) == 0:
+        return []
+    for job in jobs:
+        if os.path.splitext(job['path'])[1][1:] not in FORMATS:
+            raise ValueError(f"Figures can only be saved as: {', '.join(FORMATS)}")
+
+    workers = min(workers or os.cpu_count() or 1, len(jobs))
+    if workers == 1:
+        _init_renderer(size)
+        return [_render(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_renderer, initargs=(size,)) as pool:
+        return list(pool.map(_render, jobs, chunksize=max(1, len(jobs) // (4 * workers))))
+
+
+# One job per session of a `batch.BatchResult` (or its first `sessions`),
+# saved as `<prefix><b>.<fmt>` in `directory`. `values` are the sessions' own
+# schedules if they had them
+def batch_jobs(schedule: Schedule, result, directory: str, values: np.ndarray|None = None, fmt: str = 'png', prefix: str = 'session', title: str = "", sessions: int|None = None) -> list[dict]:
+    is_bidder = np.frombuffer(schedule.is_bidder, dtype=np.int8).astype(bool)
+    lengths = np.frombuffer(schedule.lengths, dtype=np.int64)
+    if values is None:
+        values = schedule.value_matrix()[None]
+
+    jobs = []
+    for b in range(len(result.offsets) if sessions == None else min(sessions, len(result.offsets))):
+        session_values = values[b if len(values) > 1 else 0]
+        units = [row[:length] for row, length in zip(session_values, lengths)]
+        offsets = result.offsets[b]
+        jobs.append({
+            'path': os.path.join(directory, f"{prefix}{b}.{fmt}"),
+            'costs': np.concatenate([u for u, bidder in zip(units, is_bidder) if not bidder]),
+            'redemptions': np.concatenate([u for u, bidder in zip(units, is_bidder) if bidder]),
+            'prices': result.prices[offsets[0]:offsets[-1]],
+            'offsets': offsets - offsets[0],
+            'title': title,
+            'min_price': schedule.min_price,
+            'max_price': schedule.max_price,
+        })
+    return jobs
+
+
+# Figures for the first `sessions` sessions of every point of the config's
+# sweep grid, saved as `point<i>_session<b>.<config.sweep_figure_format>` in
+# `config.sweep_figures` and rendered over `config.sweep_workers` processes.
+# They're the sessions of the point's first seed in the sweep itself: the
+# unit gets run again with the batch engine (same seed, same values), which
+# is much quicker than drawing them
+def sweep_figures(config: Config, sessions: int = 1) -> list[str]:
+    # Imported here since `modules.sweep` doesn't need anything from here
+    from modules.sweep import grid_points, simulate_unit
+
+    directory = config.sweep_figures
+    os.makedirs(directory, exist_ok=True)
+    # Seed 0 of every point, like in `sweep.sweep()`
+    seed_seq = Streams(config.seed_entropy).session(0)
+
+    jobs = []
+    for i, (point, point_config) in enumerate(grid_points(config)):
+        values, schedule, result = simulate_unit(point_config, seed_seq)
+        title = ", ".join(f"{key}={value}" for key, value in point.items())
+        jobs += batch_jobs(schedule, result, directory, values, config.sweep_figure_format, f"point{i}_session", title, sessions)
+
+    return render_figures(jobs, config.sweep_workers)
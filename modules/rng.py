@@ -0,0 +1,144 @@
+import numpy as np
+
+# Every random number of a market comes from one tree of NumPy seed sequences
+# grown from the market's seed, and nothing uses the global `random`. Each
+# node is addressed by its spawn key instead of being spawned in turn, so any
+# process can make any stream on its own and the results don't depend on how
+# the work is split up:
+#
+#   (session,)                           a whole session (what a sweep unit uses)
+#   (session, POPULATION)                the traders' schedules
+#   (session, PERIODS, period, PICKS)    who quotes next
+#   (session, PERIODS, period, OFFERS)   key of every trader's offer stream
+#   (session, LEARNING)                  what learning strategies draw (see
+#                                        `modules.strategy`), over all periods
+#
+# Session b is the same node as `SeedSequence(seed).spawn(n)[b]`, so sweeps
+# that spawn their units get the same streams
+POPULATION = 0
+PERIODS = 1
+LEARNING = 2
+PICKS = 0
+OFFERS = 1
+
+# Most numbers drawn at a time
+DEFAULT_BLOCK = 4096
+# Blocks start this small and grow up to the block size, so short periods
+# don't draw numbers they never use
+FIRST_BLOCK = 16
+# About how many numbers NumPy can draw in the time it takes to make one
+# call, see `PeriodDraws.more_offers()`
+CALL_COST = 1024
+
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+
+
+class Streams:
+    def __init__(self, seed: int):
+        self.seed = seed
+
+    def _node(self, *key) -> np.random.SeedSequence:
+        return np.random.SeedSequence(self.seed, spawn_key=key)
+
+    def session(self, session: int = 0) -> np.random.SeedSequence:
+        return self._node(session)
+
+    def population(self, session: int = 0) -> np.random.SeedSequence:
+        return self._node(session, POPULATION)
+
+    def learning(self, session: int = 0) -> np.random.SeedSequence:
+        return self._node(session, LEARNING)
+
+    def period(self, period: int, session: int = 0) -> np.random.SeedSequence:
+        return self._node(session, PERIODS, period, PICKS)
+
+    def period_draws(self, period: int, num_traders: int, session: int = 0, block: int = DEFAULT_BLOCK) -> 'PeriodDraws':
+        offers = self._node(session, PERIODS, period, OFFERS)
+        return PeriodDraws(self.period(period, session), int(offers.generate_state(1, np.uint64)[0]), num_traders, block)
+
+
+# SplitMix64's output function over uint64s (wrapping around like C)
+def _mix(x: np.ndarray) -> np.ndarray:
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+# Uniform doubles in [0, 1), number k of trader t's stream under `key` is a
+# hash of (t, k). Making a NumPy generator for every trader would cost far
+# more than most traders ever draw, while this fills blocks of any number of
+# traders' streams in one go
+def trader_uniforms(key: int, traders: np.ndarray, counters: np.ndarray) -> np.ndarray:
+    position = (np.asarray(traders, dtype=np.uint64) << np.uint64(32)) + np.asarray(counters, dtype=np.uint64) + np.uint64(1)
+    # Arrays wrap around without warnings, unlike NumPy scalars
+    bits = _mix(np.uint64(key) + position * _GOLDEN)
+    return (bits >> np.uint64(11)) * (1.0 / (1 << 53))
+
+
+# The random numbers of one period, pre-drawn in blocks that get refilled when
+# they run out: who quotes (from the period's NumPy generator) and every
+# trader's own offer numbers. Both are handed out by iterators, so the
+# auction loop only pays for a `next()`, and `more_picks()`/`more_offers(t)`
+# refill one when it runs out and give back its next number.
+#
+# Refilling one trader at a time would cost a NumPy call for every few
+# numbers, so offer numbers come in generations of blocks, each twice as big
+# as the last (up to `block`), which can be drawn for everyone at once. Every
+# stream is used in order, so the block sizes only change speed and memory,
+# never the numbers
+class PeriodDraws:
+    def __init__(self, picks: np.random.SeedSequence, key: int, num_traders: int, block: int = DEFAULT_BLOCK):
+        if block <= 0:
+            raise ValueError("block must be greater than 0")
+        self.generator = np.random.default_rng(picks)
+        self.key = key
+        self.block = block
+        self.num_traders = num_traders
+
+        self.pick_block = min(FIRST_BLOCK, block)
+        self.picks = iter(())
+        # Where every generation starts in everyone's stream, its rows (None
+        # until it's drawn for everyone), how many traders had to draw it on
+        # their own and which one every trader is on
+        self.starts = [0]
+        self.generations = []
+        self.asked = []
+        self.generation = [0] * num_traders
+        self._add_generation()
+        self.offers = [iter(row) for row in self._draw_generation(0).tolist()]
+
+    def more_picks(self) -> float:
+        self.picks = iter(self.generator.random(self.pick_block).tolist())
+        self.pick_block = min(self.pick_block * 2, self.block)
+        return next(self.picks)
+
+    def _add_generation(self):
+        g = len(self.generations)
+        self.starts.append(self.starts[g] + min(FIRST_BLOCK * 2**g, self.block))
+        self.generations.append(None)
+        self.asked.append(0)
+
+    def _draw_generation(self, g: int) -> np.ndarray:
+        counters = np.arange(self.starts[g], self.starts[g + 1])
+        self.generations[g] = trader_uniforms(self.key, np.arange(self.num_traders)[:, None], counters)
+        return self.generations[g]
+
+    # Trader t's next block of offer numbers. The next generation gets drawn
+    # for everyone once about as many traders have needed it as it would have
+    # cost to draw it for everyone, until then traders draw their own block of
+    # it. When most traders hardly quote, the busiest ones don't make everyone
+    # draw numbers they'll never use
+    def more_offers(self, t: int) -> float:
+        g = self.generation[t] = self.generation[t] + 1
+        if g == len(self.generations):
+            self._add_generation()
+        rows = self.generations[g]
+        if rows is None:
+            self.asked[g] += 1
+            if self.num_traders * (self.starts[g + 1] - self.starts[g]) <= CALL_COST * self.asked[g]:
+                rows = self._draw_generation(g)
+        if rows is None:
+            row = trader_uniforms(self.key, t, np.arange(self.starts[g], self.starts[g + 1]))
+        else:
+            row = rows[t]
+        self.offers[t] = iter(row.tolist())
+        return next(self.offers[t])
@@ -0,0 +1,128 @@
+import json
+import sqlite3
+import time
+import numpy as np
+
+# Sweep results kept in one SQLite file, so a sweep that gets stopped halfway
+# (or pre-empted) only has to run the units it hadn't finished. Every unit
+# (one seed of one grid point, see `modules.sweep`) is written the moment it
+# finishes, along with running totals of its grid point, so summaries can be
+# read at any time, even by another process while the sweep is still going,
+# without going through the units again.
+#
+# Summaries are (count, mean, sum of squared deviations) of each statistic,
+# which merge exactly (Chan et al.'s pairwise form of Welford's update)
+
+# What every unit summarizes
+STATS = ('price', 'efficiency', 'trades')
+
+
+# Count, mean and sum of squared deviations of `x`, so summaries from
+# different units can be merged exactly
+def moments(x: np.ndarray) -> tuple:
+    x = np.asarray(x, dtype=np.float64).ravel()
+    if len(x) == 0:
+        return (0, 0.0, 0.0)
+    mean = float(x.mean())
+    return (len(x), mean, float(((x - mean)**2).sum()))
+
+
+# Chan et al.'s way of combining two (count, mean, M2) summaries
+def merge(a: tuple, b: tuple) -> tuple:
+    n_a, mean_a, m2_a = a
+    n_b, mean_b, m2_b = b
+    n = n_a + n_b
+    if n == 0:
+        return (0, 0.0, 0.0)
+    delta = mean_b - mean_a
+    return (n, mean_a + delta * n_b / n, m2_a + m2_b + delta**2 * n_a * n_b / n)
+
+
+# Means and sample variances of a summary per statistic, the way sweep rows
+# have them
+def finish(summary: dict) -> dict:
+    row = {}
+    for key, (count, mean, m2) in summary.items():
+        row[f"{key}_mean"] = mean
+        row[f"{key}_var"] = m2 / (count - 1) if count > 1 else 0.0
+    return row
+
+
+_COLUMNS = ", ".join(f"{stat}_{part} {kind}" for stat in STATS for part, kind in (('count', 'INTEGER'), ('mean', 'REAL'), ('m2', 'REAL')))
+_NAMES = ", ".join(f"{stat}_{part}" for stat in STATS for part in ('count', 'mean', 'm2'))
+_SLOTS = ", ".join("?" for _ in range(3 * len(STATS)))
+
+
+def _flatten(summary: dict) -> list:
+    return [value for stat in STATS for value in summary[stat]]
+
+def _summary(values) -> dict:
+    return {stat: (int(values[3*i]), float(values[3*i + 1]), float(values[3*i + 2])) for i, stat in enumerate(STATS)}
+
+
+# `units` has one row per finished unit (keyed by everything its result
+# depends on), `points` one per grid point with the merged summaries of all
+# its units so far. Units of the same point from different seeds or
+# different runs all go into its totals, a unit that's already there never
+# gets counted twice
+class SweepStore:
+    def __init__(self, path: str):
+        self.path = path
+        # Transactions get started by hand, see `add()`
+        self.connection = sqlite3.connect(path, timeout=60, isolation_level=None)
+        # Readers don't block the sweep writing and the other way around
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(f"CREATE TABLE IF NOT EXISTS units (key TEXT PRIMARY KEY, point TEXT NOT NULL, seed INTEGER NOT NULL, sessions INTEGER NOT NULL, finished REAL NOT NULL, {_COLUMNS})")
+        self.connection.execute(f"CREATE TABLE IF NOT EXISTS points (point TEXT PRIMARY KEY, grid TEXT NOT NULL, units INTEGER NOT NULL, sessions INTEGER NOT NULL, {_COLUMNS})")
+
+    @classmethod
+    def from_config(cls, config) -> 'SweepStore|None':
+        if not config.sweep_store:
+            return None
+        return cls(config.sweep_store)
+
+    def close(self):
+        self.connection.close()
+
+    # Summaries of the units in `keys` that are done, by key
+    def get(self, keys: list[str]) -> dict[str, dict]:
+        found = {}
+        # SQLite only takes so many parameters at once
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i+500]
+            rows = self.connection.execute(f"SELECT key, {_NAMES} FROM units WHERE key IN ({', '.join('?' * len(chunk))})", chunk)
+            for key, *values in rows:
+                found[key] = _summary(values)
+        return found
+
+    # Records a finished unit of grid point `point` (whose grid values are
+    # `grid`) and merges it into the point's totals, both or neither
+    def add(self, key: str, point: str, grid: dict, seed: int, sessions: int, summary: dict):
+        connection = self.connection
+        # Taking the write lock first so nobody else can merge in between
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            added = connection.execute(f"INSERT OR IGNORE INTO units (key, point, seed, sessions, finished, {_NAMES}) VALUES (?, ?, ?, ?, ?, {_SLOTS})",
+                                       [key, point, seed, sessions, time.time()] + _flatten(summary)).rowcount
+            if added:
+                row = connection.execute(f"SELECT units, sessions, {_NAMES} FROM points WHERE point = ?", (point,)).fetchone()
+                units, total_sessions, totals = (0, 0, {stat: (0, 0.0, 0.0) for stat in STATS}) if row == None else (row[0], row[1], _summary(row[2:]))
+                totals = {stat: merge(totals[stat], summary[stat]) for stat in STATS}
+                connection.execute(f"INSERT OR REPLACE INTO points (point, grid, units, sessions, {_NAMES}) VALUES (?, ?, ?, ?, {_SLOTS})",
+                                   [point, json.dumps(grid), units + 1, total_sessions + sessions] + _flatten(totals))
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+    # The running totals of every point in the store (or of `points` only,
+    # in that order, leaving out the ones without units yet) as sweep rows:
+    # grid values, units and sessions so far, means and variances
+    def points(self, points: list[str]|None = None) -> list[dict]:
+        query = f"SELECT point, grid, units, sessions, {_NAMES} FROM points"
+        found = {}
+        for point, grid, units, sessions, *values in self.connection.execute(query):
+            found[point] = dict(json.loads(grid), units=units, sessions=sessions, **finish(_summary(values)))
+        if points == None:
+            return list(found.values())
+        return [found[point] for point in points if point in found]
@@ -0,0 +1,381 @@
+from abc import ABC, abstractmethod
+import math
+import numpy as np
+
+# How traders pick their offers. A strategy makes the offers of a whole array
+# of traders in one call and learning strategies get told about every shout,
+# so they can update what they've learned. Engines can run many sessions of
+# the same traders at once (`batch.batch_market()` does, `market.market()`
+# runs session 0 only), so every call says which session each trader is in
+# and learned state is kept as sessions x traders arrays. A strategy only
+# ever touches its own traders' columns, which is how one market mixes them.
+# Engines that make one offer at a time use `offer()` and `observe_one()`
+# instead, which take plain numbers and skip the array overhead.
+#
+# Built in: ZI-C and ZI-U (Gode & Sunder 1993), ZIP (Cliff 1997) and GD
+# (Gjerstad & Dickhaut 1998). Other strategies go in `STRATEGIES`
+
+
+class Strategy(ABC):
+    name = ''
+    # Whether it never trades at a loss, which is how `TraderBook` tells
+    # whether trading is over
+    constrained = True
+    # Only strategies that learn get `observe()` calls
+    learns = False
+
+    # Gets ready for `sessions` sessions of traders with roles `is_bidder`,
+    # `mine` being the ones using this strategy. `rng` is for anything the
+    # strategy draws itself
+    def start(self, sessions: int, is_bidder: np.ndarray, mine: np.ndarray, min_price: int, max_price: int, rng: np.random.Generator):
+        self.is_bidder = is_bidder
+        # For looking up one trader at a time
+        self.bidders = is_bidder.tolist()
+        self.mine = np.flatnonzero(mine)
+        self.min_price = min_price
+        self.max_price = max_price
+        self.rng = rng
+
+    # Offers of `traders` (in `sessions`), whose current units are worth
+    # `values`, with a uniform number in [0, 1) from each trader's own stream
+    @abstractmethod
+    def offers(self, sessions: np.ndarray, traders: np.ndarray, values: np.ndarray, u: np.ndarray) -> np.ndarray:
+        pass
+
+    # One shout in each of `sessions` (no session twice): its price, whether
+    # it was a bid and whether it traded and at what price. `values` are the
+    # current values of every trader in those sessions (sessions x traders)
+    # and `alive` whether they still have units to trade
+    def observe(self, sessions: np.ndarray, price: np.ndarray, was_bid: np.ndarray, traded: np.ndarray, trade_price: np.ndarray, values: np.ndarray, alive: np.ndarray):
+        pass
+
+    # `offers()` of a single trader
+    def offer(self, session: int, trader: int, value: int, u: float) -> int:
+        return int(self.offers(np.array([session]), np.array([trader]), np.array([value]), np.array([u]))[0])
+
+    # `observe()` of a single shout, `values` and `alive` are only that
+    # session's (one per trader)
+    def observe_one(self, session: int, price: int, was_bid: bool, traded: bool, trade_price: int, values: np.ndarray, alive: np.ndarray):
+        self.observe(np.array([session]), np.array([price]), np.array([was_bid]), np.array([traded]), np.array([trade_price]), values[None], alive[None])
+
+
+# Uniform over a range that only depends on the current unit, and nothing
+# gets learned. That's what lets `market.run_period()` inline these and
+# `batch.batch_market()` skip straight to the offers that improve
+class ZeroIntelligence(Strategy):
+    # Lowest and highest offer of `traders` for units worth `values` (which
+    # can have any number of leading dimensions)
+    @abstractmethod
+    def ranges(self, traders: np.ndarray, values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        pass
+
+    def offers(self, sessions, traders, values, u):
+        lo, hi = self.ranges(traders, values)
+        return lo + (u * (hi - lo + 1)).astype(np.int64)
+
+
+# Never trades at a loss: bidders bid up to their value and sellers ask from
+# their cost up
+class ZIC(ZeroIntelligence):
+    name = 'zic'
+
+    def ranges(self, traders, values):
+        bidder = self.is_bidder[traders]
+        return np.where(bidder, self.min_price, values), np.where(bidder, values, self.max_price)
+
+    def offer(self, session, trader, value, u):
+        if self.bidders[trader]:
+            return self.min_price + int(u * (value - self.min_price + 1))
+        return value + int(u * (self.max_price - value + 1))
+
+
+# Anything between the price limits
+class ZIU(ZeroIntelligence):
+    name = 'ziu'
+    constrained = False
+
+    def ranges(self, traders, values):
+        shape = np.shape(values)
+        return np.full(shape, self.min_price, dtype=np.int64), np.full(shape, self.max_price, dtype=np.int64)
+
+    def offer(self, session, trader, value, u):
+        return self.min_price + int(u * (self.max_price - self.min_price + 1))
+
+
+# Zero intelligence plus: every trader quotes their value plus (sellers) or
+# minus (bidders) a profit margin, and after every shout the traders who
+# would have done better nudge their price towards a target just past the
+# shout's price with a Widrow-Hoff step. `beta` (learning rate), `gamma`
+# (momentum) and the first `margin` are drawn per trader from these ranges,
+# `relative` and `absolute` set how far past the shout the targets are (the
+# absolute part as a fraction of the price range)
+class ZIP(Strategy):
+    name = 'zip'
+    learns = True
+
+    def __init__(self, beta=(0.1, 0.5), gamma=(0.0, 0.1), margin=(0.05, 0.35), relative=0.05, absolute=0.01):
+        self.beta = beta
+        self.gamma = gamma
+        self.margin_range = margin
+        self.relative = relative
+        self.absolute = absolute
+
+    def start(self, sessions, is_bidder, mine, min_price, max_price, rng):
+        super().start(sessions, is_bidder, mine, min_price, max_price, rng)
+        # Learned state only has columns for this strategy's own traders,
+        # `column` says which one is whose
+        shape = (sessions, len(self.mine))
+        self.column = np.zeros(len(is_bidder), dtype=np.int64)
+        self.column[self.mine] = np.arange(len(self.mine))
+        self.learning_rate = rng.uniform(*self.beta, size=shape)
+        self.momentum_rate = rng.uniform(*self.gamma, size=shape)
+        self.margin = rng.uniform(*self.margin_range, size=shape)
+        self.momentum = np.zeros(shape)
+        # The part of the target every Widrow-Hoff step takes
+        self.step = (1 - self.momentum_rate) * self.learning_rate
+
+        self.bidder = is_bidder[self.mine]
+        # Prices are value * (1 + sign * margin), and margins go up to 1 for
+        # bidders (who'd quote 0) but without a limit for sellers
+        self.sign = np.where(self.bidder, -1.0, 1.0)
+        self.most = np.where(self.bidder, 1.0, np.inf)
+        self.spread = self.absolute * (max_price - min_price)
+
+    # Bidders round down and sellers up, so nobody quotes past their value
+    def _quotes(self, sign, prices) -> np.ndarray:
+        return np.minimum(np.maximum(-sign * np.floor(-sign * prices), self.min_price), self.max_price)
+
+    def offers(self, sessions, traders, values, u):
+        columns = self.column[traders]
+        sign = self.sign[columns]
+        return self._quotes(sign, values * (1 + sign * self.margin[sessions, columns])).astype(np.int64)
+
+    def offer(self, session, trader, value, u):
+        margin = float(self.margin[session, self.column[trader]])
+        if self.bidders[trader]:
+            return min(max(math.floor(value * (1 - margin)), self.min_price), self.max_price)
+        return min(max(math.ceil(value * (1 + margin)), self.min_price), self.max_price)
+
+    def observe(self, sessions, price, was_bid, traded, trade_price, values, alive):
+        q = np.where(traded, trade_price, price)[:, None]
+        self._learn(sessions, q, was_bid[:, None], traded[:, None], values[:, self.mine], alive[:, self.mine])
+
+    def observe_one(self, session, price, was_bid, traded, trade_price, values, alive):
+        self._learn(session, trade_price if traded else price, was_bid, traded, values[self.mine], alive[self.mine])
+
+    # Updates the margins of this strategy's traders in `rows` (an array of
+    # sessions, or a single one) after a shout that went at price `q`.
+    # `values` and `alive` are only their own traders', `q`, `was_bid` and
+    # `traded` broadcast against them
+    def _learn(self, rows, q, was_bid, traded, values, alive):
+        sign, bidder = self.sign, self.bidder
+        margin = self.margin[rows]
+        prices = values * (1 + sign * margin)
+
+        # Sellers asking at most the price (bidders bidding at least it) would
+        # have traded there, the ones asking at least it wouldn't. What they'd
+        # really quote counts, otherwise rounding could keep a trader from
+        # ever reacting to their own rejected shouts
+        past = sign * (self._quotes(sign, prices) - q)
+        # A trade means they could have asked for more, a trade with the
+        # other side or a shout on their side that didn't trade means they
+        # should give some up
+        raise_margin = alive & traded & (past <= 0)
+        other_side = (was_bid == traded) ^ bidder
+        lower_margin = alive & ~raise_margin & (past >= 0) & other_side
+        changed = raise_margin | lower_margin
+        if not changed.any():
+            return
+
+        # Higher prices for sellers raising their margin and bidders lowering
+        # it, the targets are q * (1 +- relative * r) +- spread * a
+        up = np.where(raise_margin ^ bidder, 1.0, -1.0)
+        r, a = self.rng.random((2,) + prices.shape)
+        target = q * (1 + up * (self.relative * r)) + up * (self.spread * a)
+
+        momentum = self.momentum[rows]
+        momentum = np.where(changed, self.momentum_rate[rows] * momentum + self.step[rows] * (target - prices), momentum)
+        new_prices = prices + momentum
+
+        ratio = np.divide(new_prices, values, out=np.ones_like(new_prices), where=values > 0)
+        new_margin = np.minimum(np.maximum(sign * (ratio - 1), 0), self.most)
+        self.margin[rows] = np.where(changed, new_margin, margin)
+        self.momentum[rows] = momentum
+
+
+# Kinds of shouts `GD` remembers
+ACCEPTED_BID, REJECTED_BID, ACCEPTED_ASK, REJECTED_ASK = 0, 1, 2, 3
+
+
+# Gjerstad-Dickhaut: every trader turns the last `memory` shouts of their
+# session into a belief of how likely each price is to get accepted and
+# quotes the price with the highest expected profit. A seller believes an
+# ask of a gets accepted with
+#
+#   (accepted asks >= a + bids >= a) / (accepted asks >= a + bids >= a + rejected asks <= a)
+#
+# and bidders the same the other way around. Beliefs are worked out at every
+# whole price instead of interpolated, and a shout counts as accepted when it
+# traded right away (plus the standing quote it traded with, at the trade
+# price). With nothing to go on yet, traders quote like ZI-C
+class GD(Strategy):
+    name = 'gd'
+    learns = True
+
+    def __init__(self, memory: int = 50):
+        if memory <= 0:
+            raise ValueError("memory must be greater than 0")
+        self.memory = memory
+
+    def start(self, sessions, is_bidder, mine, min_price, max_price, rng):
+        super().start(sessions, is_bidder, mine, min_price, max_price, rng)
+        # Shouts of every kind at every price, and the shouts themselves in a
+        # ring so the oldest can be taken out again (kind -1 for none yet)
+        self.counts = np.zeros((sessions, 4, max_price - min_price + 1), dtype=np.int32)
+        self.kinds = np.full((sessions, self.memory), -1, dtype=np.int8)
+        self.prices = np.zeros((sessions, self.memory), dtype=np.int64)
+        self.head = np.zeros(sessions, dtype=np.int64)
+        # Every price a trader could quote
+        self.grid = np.arange(min_price, max_price + 1)
+
+    def _remember(self, sessions, kinds, prices):
+        head = self.head[sessions]
+        old = self.kinds[sessions, head]
+        full = old >= 0
+        self.counts[sessions[full], old[full], self.prices[sessions[full], head[full]]] -= 1
+
+        prices = np.clip(prices, self.min_price, self.max_price) - self.min_price
+        self.kinds[sessions, head] = kinds
+        self.prices[sessions, head] = prices
+        self.counts[sessions, kinds, prices] += 1
+        self.head[sessions] = (head + 1) % self.memory
+
+    # `_remember()` of a single shout
+    def _remember_one(self, session, kind, price):
+        head = int(self.head[session])
+        old = self.kinds[session, head]
+        if old >= 0:
+            self.counts[session, old, self.prices[session, head]] -= 1
+
+        price = min(max(price, self.min_price), self.max_price) - self.min_price
+        self.kinds[session, head] = kind
+        self.prices[session, head] = price
+        self.counts[session, kind, price] += 1
+        self.head[session] = (head + 1) % self.memory
+
+    def observe(self, sessions, price, was_bid, traded, trade_price, values, alive):
+        kinds = np.where(was_bid, np.where(traded, ACCEPTED_BID, REJECTED_BID), np.where(traded, ACCEPTED_ASK, REJECTED_ASK))
+        self._remember(sessions, kinds, price)
+        if traded.any():
+            self._remember(sessions[traded], np.where(was_bid[traded], ACCEPTED_ASK, ACCEPTED_BID), trade_price[traded])
+
+    def observe_one(self, session, price, was_bid, traded, trade_price, values, alive):
+        if was_bid:
+            self._remember_one(session, ACCEPTED_BID if traded else REJECTED_BID, price)
+        else:
+            self._remember_one(session, ACCEPTED_ASK if traded else REJECTED_ASK, price)
+        if traded:
+            self._remember_one(session, ACCEPTED_ASK if was_bid else ACCEPTED_BID, trade_price)
+
+    # How likely every price is to get accepted for bidders (or sellers) in
+    # sessions with shout `counts`: shouts for it (pro) and against it (con)
+    # that go at or below it and at or above it
+    def _beliefs(self, counts: np.ndarray, bidding: bool) -> np.ndarray:
+        if bidding:
+            pro = (counts[:, ACCEPTED_BID] + counts[:, ACCEPTED_ASK] + counts[:, REJECTED_ASK]).cumsum(axis=1)
+            con = counts[:, REJECTED_BID, ::-1].cumsum(axis=1)[:, ::-1]
+        else:
+            pro = (counts[:, ACCEPTED_ASK] + counts[:, ACCEPTED_BID] + counts[:, REJECTED_BID])[:, ::-1].cumsum(axis=1)[:, ::-1]
+            con = counts[:, REJECTED_ASK].cumsum(axis=1)
+        total = pro + con
+        return np.divide(pro, total, out=np.zeros(pro.shape), where=total > 0)
+
+    def offers(self, sessions, traders, values, u):
+        bidder = self.is_bidder[traders]
+        grid = self.grid
+        offers = np.empty(len(traders), dtype=np.int64)
+        for bidding in (True, False):
+            side = np.flatnonzero(bidder == bidding)
+            if len(side) == 0:
+                continue
+            value = values[side]
+            profit = value[:, None] - grid if bidding else grid - value[:, None]
+            expected = np.where(profit >= 0, profit * self._beliefs(self.counts[sessions[side]], bidding), -1.0)
+            best = expected.argmax(axis=1)
+
+            lo, hi = (self.min_price, value) if bidding else (value, self.max_price)
+            guess = lo + (u[side] * (hi - lo + 1)).astype(np.int64)
+            guessing = expected[np.arange(len(side)), best] <= 0
+            offers[side] = np.where(guessing, guess, grid[best])
+        return offers
+
+    def offer(self, session, trader, value, u):
+        bidding = self.bidders[trader]
+        grid = self.grid
+        profit = value - grid if bidding else grid - value
+        expected = np.where(profit >= 0, profit * self._beliefs(self.counts[session:session+1], bidding)[0], -1.0)
+        best = int(expected.argmax())
+        if expected[best] > 0:
+            return self.min_price + best
+        lo, hi = (self.min_price, value) if bidding else (value, self.max_price)
+        return lo + int(u * (hi - lo + 1))
+
+
+STRATEGIES = {
+    'zic': ZIC,
+    'ziu': ZIU,
+    'zip': ZIP,
+    'gd': GD,
+}
+
+
+# The strategies of one market's traders: one of each strategy that's used
+# (started for `sessions` sessions) and which one every trader uses
+class StrategyMix:
+    def __init__(self, names: list[str], is_bidder, sessions: int, min_price: int, max_price: int, rng: np.random.Generator):
+        self.strategies = []
+        used = []
+        kinds = []
+        for name in names:
+            if name not in STRATEGIES:
+                raise ValueError(f"Unknown strategy {name}, only: {', '.join(STRATEGIES)}")
+            if name not in used:
+                used.append(name)
+                self.strategies.append(STRATEGIES[name]())
+            kinds.append(used.index(name))
+
+        self.kinds = np.array(kinds, dtype=np.int64)
+        is_bidder = np.asarray(is_bidder, dtype=bool)
+        for k, strategy in enumerate(self.strategies):
+            strategy.start(sessions, is_bidder, self.kinds == k, min_price, max_price, rng)
+        self.by_trader = [self.strategies[k] for k in kinds]
+        self.learners = [s for s in self.strategies if s.learns]
+        self.zero_intelligence = all(isinstance(s, ZeroIntelligence) for s in self.strategies)
+
+    def offers(self, sessions: np.ndarray, traders: np.ndarray, values: np.ndarray, u: np.ndarray) -> np.ndarray:
+        if len(self.strategies) == 1:
+            return self.strategies[0].offers(sessions, traders, values, u)
+        offers = np.empty(len(traders), dtype=np.int64)
+        kinds = self.kinds[traders]
+        for k, strategy in enumerate(self.strategies):
+            mine = kinds == k
+            if mine.any():
+                offers[mine] = strategy.offers(sessions[mine], traders[mine], values[mine], u[mine])
+        return offers
+
+    def observe(self, sessions, price, was_bid, traded, trade_price, values, alive):
+        for strategy in self.learners:
+            strategy.observe(sessions, price, was_bid, traded, trade_price, values, alive)
+
+    def observe_one(self, session, price, was_bid, traded, trade_price, values, alive):
+        for strategy in self.learners:
+            strategy.observe_one(session, price, was_bid, traded, trade_price, values, alive)
+
+    # Every trader's offer range for units worth `values` (... x traders),
+    # only for zero intelligence mixes
+    def ranges(self, values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        lo = np.empty(values.shape, dtype=np.int64)
+        hi = np.empty(values.shape, dtype=np.int64)
+        for strategy in self.strategies:
+            lo[..., strategy.mine], hi[..., strategy.mine] = strategy.ranges(strategy.mine, values[..., strategy.mine])
+        return lo, hi
@@ -0,0 +1,191 @@
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from modules.analytics import max_surplus, schedules
+from modules.book import Schedule
+from modules.batch import BatchResult, batch_market
+from modules.cache import MARKET_FIELDS, ResultCache, cache_key
+from modules.config import Config
+import modules.population as population
+from modules.rng import Streams
+from modules.store import STATS, SweepStore, finish, merge, moments
+
+# Settings a sweep can go over. "schedules" is either "explicit" (the trader
+# schedules or the costs and redemption values in the config) or "random"
+GRID_KEYS = ('min_price', 'max_price', 'num_traders', 'num_commodities', 'constrained', 'strategies', 'schedules')
+
+
+# Every combination of the grid's values on top of `config`, in a fixed order.
+# Returns the grid values of each point and the config to run it with
+def grid_points(config: Config) -> list[tuple[dict, Config]]:
+    grid = config.grid
+    for key in grid:
+        if key not in GRID_KEYS:
+            raise ValueError(f"Can't sweep over {key}, only over: {', '.join(GRID_KEYS)}")
+
+    points = []
+    for values in itertools.product(*grid.values()):
+        point = dict(zip(grid, values))
+        changes = {key: value for key, value in point.items() if key != 'schedules'}
+        if point.get('schedules') == 'random':
+            changes.update(costs=None, redemption_values=None, trader_schedules=())
+        elif point.get('schedules') == 'explicit' and config.costs == None and not config.trader_schedules:
+            raise ValueError("Explicit schedules need costs and redemption_values or trader schedules")
+        elif point.get('schedules') not in (None, 'random', 'explicit'):
+            raise ValueError("schedules can only be either 'explicit' or 'random'")
+        points.append((point, config.replace(**changes)))
+    return points
+
+
+# Sessions x traders x commodities values for one sweep point, bidders first
+# (1 x traders x units for explicit schedules, which every session shares)
+def point_values(config: Config, sessions: int, rng: np.random.Generator) -> np.ndarray:
+    return population.population_values(config, rng, sessions)
+
+
+# The schedule of the first session of `values`, the rest get passed to the
+# batch engine as they are
+def point_schedule(config: Config, values: np.ndarray) -> Schedule:
+    explicit = population.explicit_values(config)
+    lengths = None if explicit == None else explicit[1]
+    return Schedule.from_arrays(values[0], population.roles(config), None, config.min_price, config.max_price, population.names(config), lengths, population.strategies(config))
+
+
+# One unit of work: `config.sweep_sessions` sessions of one sweep point with
+# one seed. Returns the sessions' values, the schedule and what the batch
+# engine made of them
+def simulate_unit(config: Config, seed_seq: np.random.SeedSequence) -> tuple[np.ndarray, Schedule, BatchResult]:
+    rng = np.random.default_rng(seed_seq)
+    sessions = config.sweep_sessions
+
+    values = point_values(config, sessions, rng)
+    schedule = point_schedule(config, values)
+    result = batch_market(schedule, sessions, periods=config.periods, max_steps=config.max_steps, seed=rng,
+                          values=values if len(values) == sessions else None)
+    return values, schedule, result
+
+
+# Summary of one unit (see `simulate_unit()`)
+def run_unit(config: Config, seed_seq: np.random.SeedSequence) -> dict:
+    sessions = config.sweep_sessions
+    values, schedule, result = simulate_unit(config, seed_seq)
+
+    best = max_surplus(*schedules(values, population.roles(config)))
+    best = np.broadcast_to(best, (sessions,))[:, None]
+    efficiency = np.divide(result.surplus, best, out=np.zeros(result.surplus.shape), where=best > 0)
+
+    return {
+        'price': moments(result.prices),
+        'efficiency': moments(efficiency),
+        'trades': moments(result.trades_per_period()),
+    }
+
+
+def _run_unit(args):
+    return run_unit(*args)
+
+
+# Everything a unit's summary depends on
+def _unit_key(config: Config, seed_seq: np.random.SeedSequence) -> str:
+    settings = tuple((name, getattr(config, name)) for name in MARKET_FIELDS)
+    return cache_key('sweep', settings, config.constrained, config.sweep_sessions, seed_seq.entropy, seed_seq.spawn_key)
+
+
+# Everything a grid point's units have in common, which is all but the seed
+def _point_key(config: Config) -> str:
+    settings = tuple((name, getattr(config, name)) for name in MARKET_FIELDS)
+    return cache_key('point', settings, config.constrained, config.sweep_sessions)
+
+
+# Runs `config.sweep_seeds` units of `config.sweep_sessions` sessions for
+# every point of the config's grid over a process pool and returns one summary
+# per point. Each seed index gets its own child of a seed sequence made from
+# the config's seed (the same one at every point) and summaries are merged in
+# unit order, so the results don't depend on `config.sweep_workers`, where 0
+# means all cores and 1 runs everything in this process. Units already in
+# `store` or `cache` don't get run again, and every unit that does run goes
+# into both as soon as it finishes, so a sweep that gets stopped picks up
+# where it left off. A seed that got picked (`config.seed_picked`) never comes
+# back, so then nothing goes into the cache
+def sweep(config: Config, cache: ResultCache|None = None, store: SweepStore|None = None) -> list[dict]:
+    if config.seed_picked:
+        cache = None
+    seeds = config.sweep_seeds
+    points = grid_points(config)
+    streams = Streams(config.seed_entropy)
+    seed_seqs = [streams.session(i) for i in range(seeds)]
+    units = [
+        (point_config, seed_seq)
+        for _, point_config in points
+        for seed_seq in seed_seqs
+    ]
+    point_keys = [_point_key(point_config) for _, point_config in points]
+
+    summaries = [None] * len(units)
+    if cache != None or store != None:
+        keys = [_unit_key(*unit) for unit in units]
+
+    def store_unit(i):
+        store.add(keys[i], point_keys[i // seeds], points[i // seeds][0], i % seeds, config.sweep_sessions, summaries[i])
+
+    # Every unit gets recorded the moment it's done
+    def finished(i, summary):
+        summaries[i] = summary
+        if store != None:
+            store_unit(i)
+        if cache != None:
+            cache.put(keys[i], {name: np.array(values, dtype=np.float64) for name, values in summary.items()})
+
+    if store != None:
+        stored = store.get(keys)
+        for i, key in enumerate(keys):
+            summaries[i] = stored.get(key)
+    if cache != None:
+        for i, key in enumerate(keys):
+            if summaries[i] != None:
+                continue
+            arrays = cache.get(key)
+            if arrays != None:
+                summaries[i] = {name: (int(a[0]), float(a[1]), float(a[2])) for name, a in arrays.items()}
+                # Ran before there was a store
+                if store != None:
+                    store_unit(i)
+    todo = [i for i, summary in enumerate(summaries) if summary == None]
+
+    workers = min(config.sweep_workers or os.cpu_count() or 1, max(len(todo), 1))
+    if workers == 1:
+        for i in todo:
+            finished(i, _run_unit(units[i]))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # Recorded in whatever order they finish, the summaries still get
+            # merged in unit order below
+            futures = {pool.submit(_run_unit, units[i]): i for i in todo}
+            try:
+                for future in as_completed(futures):
+                    finished(futures[future], future.result())
+            except BaseException:
+                # Ctrl-C or a failed unit, only waits for the units that are
+                # already running (the finished ones are in the store)
+                pool.shutdown(cancel_futures=True)
+                raise
+
+    results = []
+    for i, (point, _) in enumerate(points):
+        totals = {key: (0, 0.0, 0.0) for key in STATS}
+        for summary in summaries[i*seeds : (i+1)*seeds]:
+            for key in totals:
+                totals[key] = merge(totals[key], summary[key])
+
+        row = dict(point)
+        row['sessions'] = seeds * config.sweep_sessions
+        row.update(finish(totals))
+        results.append(row)
+    return results
+
+
+# What `store` has on every point of the config's grid so far (whichever
+# seeds and runs it came from), for looking at a sweep while it's running
+def stored_points(config: Config, store: SweepStore) -> list[dict]:
+    return store.points([_point_key(point_config) for _, point_config in grid_points(config)])
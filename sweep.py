@@ -0,0 +1,36 @@
+import argparse
+import sys
+from modules.cache import ResultCache
+from modules.config import Config
+from modules.store import SweepStore
+import modules.sweep as sweep
+
+# Everything runs under this guard since the sweep and the figures run on
+# process pools, which re-import this file in every worker when they spawn
+# them (the default on Windows and macOS)
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Runs the grid in the [sweep] section of config.toml")
+    parser.add_argument('--summary', action='store_true', help="Only show what the sweep store has so far, without running anything")
+    args = parser.parse_args()
+
+    config = Config.from_toml('config.toml')
+    store = SweepStore.from_config(config)
+    if args.summary:
+        if store == None:
+            sys.exit("Set store in the [sweep] section of config.toml to keep a sweep store")
+        results = sweep.stored_points(config, store)
+    else:
+        results = sweep.sweep(config, cache=ResultCache.from_config(config), store=store)
+
+    keys = list(config.grid)
+    print("\t".join(keys + ["Sessions\tPrice\tPrice var\tEfficiency\tTrades/period"]))
+    for row in results:
+        print("\t".join(
+            [str(row[k]) for k in keys] +
+            [str(row['sessions']), f"{row['price_mean']:.2f}", f"{row['price_var']:.2f}", f"{row['efficiency_mean']:.3f}", f"{row['trades_mean']:.2f}"]))
+
+    if config.sweep_figures and not args.summary:
+        # Matplotlib is only needed for this
+        import modules.render as render
+        paths = render.sweep_figures(config)
+        print(f"Saved {len(paths)} figures in {config.sweep_figures}")
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The modules get imported the way main.py imports them, from the main folder
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
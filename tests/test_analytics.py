@@ -0,0 +1,50 @@
+import numpy as np
+import modules.analytics as analytics
+import modules.market as market
+from modules.batch import batch_market
+from modules.book import Schedule
+from modules.config import Config
+from modules.ledger import MemoryLedger
+
+
+def test_fig3_equilibrium():
+    costs = (90, 90, 90, 95, 95, 95, 100, 100, 100)
+    redemptions = (135, 135, 135, 95, 95, 95, 90, 90, 90)
+    assert analytics.equilibrium_of(costs, redemptions) == (6, 95.0, 95.0)
+    demand, supply = np.array(sorted(redemptions, reverse=True)), np.array(sorted(costs))
+    assert analytics.max_surplus(demand, supply) == 3 * 45
+    assert analytics.equilibrium_of((10, 20), (5, 8)) == (0, None, None)
+
+
+def test_batch_stats_one_session_at_a_time():
+    config = Config(num_traders=8, num_commodities=4, periods=2, timeout=0, random_seed=9)
+    traders = market.gen_traders(config)
+    schedule = Schedule(traders, config.min_price, config.max_price)
+    result = batch_market(schedule, 20, periods=2, seed=3)
+    stats = analytics.batch_stats(schedule, result)
+
+    costs = [v for t in traders if not t.is_bidder for v in t.redemptions_or_costs]
+    redemptions = [v for t in traders if t.is_bidder for v in t.redemptions_or_costs]
+    quantity, low, high = analytics.equilibrium_of(tuple(costs), tuple(redemptions))
+    price = (low + high) / 2
+    best = sum(max(d - s, 0) for d, s in zip(sorted(redemptions, reverse=True), sorted(costs)))
+    assert (stats.equilibrium_quantity, stats.equilibrium_price, stats.max_surplus) == (quantity, price, best)
+    for b in range(20):
+        for p, prices in enumerate(result.session_prices(b)):
+            assert stats.trades[b, p] == len(prices)
+            assert np.isclose(stats.efficiency[b, p], result.surplus[b, p] / best)
+            if prices:
+                rms = np.sqrt(np.mean((np.array(prices) - price)**2))
+                assert np.isclose(stats.rms_deviation[b, p], rms)
+                assert np.isclose(stats.smiths_alpha[b, p], 100 * rms / price)
+
+
+def test_ledger_stats():
+    config = Config(num_traders=8, num_commodities=4, periods=3, timeout=0, random_seed=9)
+    traders = market.gen_traders(config)
+    ledger = MemoryLedger()
+    market.market(traders, config, ledgers=(ledger,))
+    stats = analytics.ledger_stats(Schedule(traders, config.min_price, config.max_price), ledger)
+    assert stats.trades.tolist() == [len(prices) for prices in ledger.transaction_prices()]
+    # ZI-C traders never lose money, so they can't beat the best there is
+    assert ((stats.efficiency > 0) & (stats.efficiency <= 1)).all()
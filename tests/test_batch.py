@@ -0,0 +1,67 @@
+import numpy as np
+import modules.batch as batch
+import modules.ledger as ledger
+import modules.market as market
+from modules.batch import batch_market
+from modules.book import Schedule
+from modules.config import Config
+from modules.instrument import Instrumentation
+
+CONFIG = Config(num_traders=6, num_commodities=5, periods=1, timeout=0, random_seed=4)
+
+
+def test_same_distribution_as_market():
+    for constrained in (True, False):
+        traders = market.gen_traders(CONFIG, constrained)
+        prices, trades = [], []
+        for seed in range(1, 401):
+            period = market.market(traders, CONFIG, seed=seed)[0]
+            prices += period
+            trades.append(len(period))
+        prices, trades = np.array(prices), np.array(trades)
+        result = batch_market(Schedule(traders, CONFIG.min_price, CONFIG.max_price), 4000, seed=5)
+        per_period = result.trades_per_period()
+
+        # Within 4 standard errors of each other, the seeds are fixed so this
+        # either always passes or never does
+        error = prices.std() * np.sqrt(1 / len(prices) + 1 / len(result.prices))
+        assert abs(prices.mean() - result.prices.mean()) < 4 * error
+        assert abs(prices.std() / result.prices.std() - 1) < 0.05
+        error = max(trades.std(), per_period.std()) * np.sqrt(1 / len(trades) + 1 / per_period.size)
+        assert abs(trades.mean() - per_period.mean()) <= 4 * error
+
+
+# The batch engine's reasons as `market()` gives them
+REASONS = {batch.EXHAUSTED: ledger.EXHAUSTED, batch.NO_GAINS: ledger.NO_GAINS, batch.OUT_OF_STEPS: ledger.OUT_OF_STEPS}
+
+
+def test_periods_end_like_market():
+    for constrained in (True, False):
+        traders = market.gen_traders(CONFIG, constrained)
+        instrument = Instrumentation()
+        for seed in range(1, 401):
+            market.market(traders, CONFIG, seed=seed, instrument=instrument)
+        draws = np.array([stats.draws for stats in instrument.periods])
+        result = batch_market(Schedule(traders, CONFIG.min_price, CONFIG.max_price), 4000, seed=5)
+
+        assert {REASONS[reason] for reason in result.reasons.ravel().tolist()} == {stats.reason for stats in instrument.periods}
+        error = max(draws.std(), result.draws.std()) * np.sqrt(1 / len(draws) + 1 / result.draws.size)
+        assert abs(draws.mean() - result.draws.mean()) < 4 * error
+
+
+def test_no_gains_from_the_start():
+    traders = [market.Trader(bidder=True, redemptions_or_costs=[90]), market.Trader(bidder=False, redemptions_or_costs=[95])]
+    config = CONFIG.replace(max_steps=10)
+    memory = ledger.MemoryLedger()
+    market.market(traders, config, ledgers=(memory,))
+    result = batch_market(Schedule(traders, config.min_price, config.max_price), 20, max_steps=config.max_steps, seed=7)
+    assert memory.reasons == [ledger.NO_GAINS] * config.periods
+    assert (result.reasons == batch.NO_GAINS).all() and (result.draws == 0).all()
+
+
+def test_constrained_sessions():
+    traders = market.gen_traders(CONFIG.replace(num_traders=20), True)
+    result = batch_market(Schedule(traders, CONFIG.min_price, CONFIG.max_price), 50, periods=3, seed=6)
+    assert result.offsets.shape == (50, 4)
+    assert (result.surplus >= 0).all()
+    assert result.session_prices(0) == [result.prices[result.offsets[0, p]:result.offsets[0, p+1]].tolist() for p in range(3)]
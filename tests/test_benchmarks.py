@@ -0,0 +1,34 @@
+import os
+import sys
+import pytest
+from conftest import ROOT
+
+# The suite imports its neighbours the way it gets run, as a script
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+import suite
+
+
+def results(draws_per_s: float, peak_bytes: int, draws: int) -> dict:
+    return {
+        'settings': {'seed': suite.SEED, 'periods': 2, 'max_steps': 10_000, 'quick': True},
+        'startup_ms': 100.0,
+        'cases': {'fig3': {'reference': {'draws_per_s': draws_per_s, 'peak_bytes': peak_bytes, 'draws': draws}}},
+    }
+
+
+def test_compare():
+    baseline = results(1e6, 1000, 500)
+    assert suite.compare(results(0.9e6, 1200, 500), baseline) == ([], [])
+    regressions, changed = suite.compare(results(0.5e6, 2000, 501), baseline)
+    assert [line.split(':')[0] for line in regressions] == ['fig3/reference/draws_per_s', 'fig3/reference/peak_bytes']
+    assert changed == ['fig3/reference/draws: 500 -> 501']
+    with pytest.raises(ValueError):
+        suite.compare(results(1e6, 1000, 500), dict(baseline, settings={'seed': 1}))
+
+
+def test_same_work_every_run():
+    name, settings = suite.cases(quick=True)[0]
+    config = suite.case_config(settings, 1, 2000)
+    first, second = suite.bench_reference(config), suite.bench_reference(config)
+    assert (first['draws'], first['trades']) == (second['draws'], second['trades'])
+    assert first['draws'] <= 2000
@@ -0,0 +1,51 @@
+from modules.book import Schedule, TraderBook
+from modules.config import Config
+from modules.market import Trader, gen_traders, market
+
+
+def book_of(*traders) -> TraderBook:
+    return TraderBook(Schedule(list(traders), 1, 200))
+
+
+def active(book: TraderBook) -> set:
+    return set(book.active[:book.num_active])
+
+
+def test_traders_leave_when_exhausted():
+    book = book_of(Trader(bidder=True, redemptions_or_costs=[150]), Trader(bidder=True, redemptions_or_costs=[140, 130]),
+                   Trader(bidder=False, redemptions_or_costs=[50]), Trader(bidder=False, redemptions_or_costs=[60, 70]))
+    assert active(book) == {0, 1, 2, 3}
+    assert book.transact(0, 100) == 50
+    assert book.transact(2, 100) == 50
+    assert active(book) == {1, 3}
+    assert (book.num_bidders, book.num_sellers) == (1, 1)
+    for i in range(4):
+        assert book.active[book.slot[i]] == i
+    assert book.best_bid_limit() == 140
+    assert book.best_ask_limit() == 60
+
+    book.transact(1, 100)
+    assert active(book) == {1, 3}
+    assert book.best_bid_limit() == 130
+
+
+def test_reset():
+    book = book_of(Trader(bidder=True, redemptions_or_costs=[150]), Trader(bidder=False, redemptions_or_costs=[50]), Trader(bidder=False, redemptions_or_costs=[]))
+    # Traders without units never get in
+    assert active(book) == {0, 1}
+    book.transact(0, 100)
+    book.transact(1, 100)
+    assert book.num_active == 0
+    book.reset()
+    assert active(book) == {0, 1}
+    assert list(book.traded) == [0, 0, 0]
+    assert list(book.profits) == [0, 0, 0]
+
+
+def test_market_leaves_traders_alone():
+    config = Config(num_traders=6, num_commodities=5, timeout=0, random_seed=3)
+    traders = gen_traders(config)
+    before = [(t.name, t.is_bidder, t.redemptions_or_costs, t.strategy) for t in traders]
+    prices = market(traders, config)
+    assert [(t.name, t.is_bidder, t.redemptions_or_costs, t.strategy) for t in traders] == before
+    assert market(traders, config) == prices
@@ -0,0 +1,77 @@
+import os
+import numpy as np
+from modules.cache import ResultCache, cached_market, market_key
+from modules.config import Config
+from modules.ledger import TRADE_COLUMNS, MemoryLedger
+from modules.rng import Streams
+from modules.sweep import _point_key, _unit_key, sweep
+
+CONFIG = Config(num_traders=6, num_commodities=5, periods=3, timeout=0, random_seed=10)
+
+
+def test_keys_cover_what_changes_results():
+    seed_seq = Streams(1).session(0)
+    for changed in (CONFIG.replace(strategies=('zip',)), CONFIG.replace(strategies=('zic', 'gd')), CONFIG.replace(periods=4),
+                    CONFIG.replace(distribution='normal')):
+        assert market_key(changed, True, 10) != market_key(CONFIG, True, 10)
+        assert _unit_key(changed, seed_seq) != _unit_key(CONFIG, seed_seq)
+        assert _point_key(changed) != _point_key(CONFIG)
+    assert market_key(CONFIG, False, 10) != market_key(CONFIG, True, 10) != market_key(CONFIG, True, 11)
+    # Settings that don't change the results don't change the key
+    same = CONFIG.replace(workers=4, quiet=False, graphs=3, sweep_workers=2)
+    assert market_key(same, True, 10) == market_key(CONFIG, True, 10)
+    assert _unit_key(same, seed_seq) == _unit_key(CONFIG, seed_seq)
+
+
+def test_cached_market(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    config = CONFIG.replace(strategies=('zic', 'zip'))
+    traders, ledger = cached_market(config, cache=cache)
+    assert cache.stats()['misses'] == 1
+
+    replay = MemoryLedger()
+    cached_traders, cached = cached_market(config, cache=cache, ledgers=(replay,))
+    assert cache.stats()['hits'] == 1
+    assert [(t.name, t.is_bidder, t.redemptions_or_costs, t.strategy) for t in cached_traders] == [(t.name, t.is_bidder, t.redemptions_or_costs, t.strategy) for t in traders]
+    assert cached.transaction_prices() == replay.transaction_prices() == ledger.transaction_prices()
+    assert cached.reasons == ledger.reasons
+    for name in TRADE_COLUMNS:
+        assert np.array_equal(replay.columns[name], ledger.columns[name])
+
+
+def test_least_recently_used_go_first(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    for age, key in enumerate(('a', 'b')):
+        cache.put(key, {'x': np.zeros(100)})
+        # Far enough apart for any file system's clock
+        os.utime(cache.file(key), (1000 * age, 1000 * age))
+    # Room for two of them
+    cache.max_bytes = cache.size() * 5 // 4
+    cache.get('a')
+    cache.put('c', {'x': np.zeros(100)})
+    assert cache.get('b') == None
+    assert cache.get('a') != None and cache.get('c') != None
+    assert cache.stats()['evictions'] == 1
+
+
+def test_picked_seeds_dont_get_cached(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    config = CONFIG.replace(random_seed=0, sweep_seeds=1, sweep_sessions=5, sweep_workers=1)
+    assert config.seed_picked and config.replace(periods=2).seed_picked
+    cached_market(config, cache=cache)
+    sweep(config, cache=cache)
+    assert cache.size() == 0 and cache.stats()['misses'] == 0
+    assert not CONFIG.seed_picked
+
+
+def test_puts_only_look_through_the_folder_when_its_full(tmp_path, monkeypatch):
+    cache = ResultCache(str(tmp_path))
+    scans = []
+    monkeypatch.setattr(cache, 'evict', lambda: scans.append(cache.bytes))
+    for i in range(20):
+        cache.put(str(i), {'x': np.zeros(100)})
+    cache.put('0', {'x': np.zeros(100)})
+    assert scans == [] and cache.bytes == cache.size()
+    cache.max_bytes = cache.size() - 1
+    cache.put('20', {'x': np.zeros(100)})
+    assert len(scans) == 1
@@ -0,0 +1,41 @@
+import dataclasses
+import os
+import pytest
+from conftest import ROOT
+from modules.config import Config
+
+
+def test_from_toml():
+    config = Config.from_toml(os.path.join(ROOT, 'config.toml'))
+    assert config.costs == (90, 90, 90, 95, 95, 95, 100, 100, 100)
+    assert config.redemption_values == (135, 135, 135, 95, 95, 95, 90, 90, 90)
+    with pytest.raises(ValueError):
+        Config.from_toml_dict({'misc': {'num_comodities': 5}})
+
+
+def test_frozen_and_validated():
+    config = Config(random_seed=3)
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        config.periods = 2
+    with pytest.raises(ValueError):
+        config.replace(num_traders=3)
+    assert config.replace(periods=2).periods == 2
+    assert config.content_hash == Config(random_seed=3).content_hash != config.replace(periods=2).content_hash
+
+
+def test_seeds():
+    assert Config(random_seed=3).seed_entropy == 3
+    assert Config(random_seed="abc").seed_entropy == Config(random_seed="abc").seed_entropy != Config(random_seed="abd").seed_entropy
+    # 0 picks one and keeps it
+    config = Config()
+    assert config.random_seed != 0 and config.seed_entropy == config.random_seed
+    with pytest.raises(ValueError):
+        Config(random_seed=-3)
+
+
+def test_nested_grid_values_stay_hashable():
+    config = Config(random_seed=3).replace(sweep_grid=(('strategies', ['zic', ['zic', 'gd']]),))
+    assert config.sweep_grid == (('strategies', ('zic', ('zic', 'gd'))),)
+    hash(config)
+    toml = Config.from_toml_dict({'misc': {'random_seed': 3}, 'sweep': {'grid': {'strategies': ['zic', ['zic', 'gd']]}}})
+    assert toml == config and hash(toml) == hash(config)
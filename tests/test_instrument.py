@@ -0,0 +1,65 @@
+import json
+import modules.market as market
+from modules.config import Config
+from modules.instrument import Instrumentation
+from modules.ledger import MemoryLedger
+
+CONFIG = Config(num_traders=10, num_commodities=10, periods=3, timeout=0, random_seed=12)
+
+
+def test_same_trades_as_without():
+    for strategies in ((), ('zic', 'zip'), ('gd',)):
+        config = CONFIG.replace(strategies=strategies)
+        traders = market.gen_traders(config)
+        plain, instrumented = MemoryLedger(), MemoryLedger()
+        market.market(traders, config, ledgers=(plain,))
+        instrument = Instrumentation()
+        market.market(traders, config, ledgers=(instrumented,), instrument=instrument)
+        assert instrumented.transaction_prices() == plain.transaction_prices()
+        assert (instrumented.step == plain.step).all()
+        assert len(instrument.periods) == config.periods
+
+
+def test_counters_add_up(tmp_path):
+    instrument = Instrumentation()
+    ledger = MemoryLedger()
+    traders = market.gen_traders(CONFIG)
+    market.market(traders, CONFIG, ledgers=(ledger,), instrument=instrument)
+
+    offsets = ledger.period_offsets()
+    for p, stats in enumerate(instrument.periods):
+        steps = ledger.step[offsets[p]:offsets[p+1]]
+        assert stats.period == p and stats.reason == ledger.reasons[p]
+        assert stats.trades == len(steps) == sum(stats.gap_histogram)
+        assert stats.draws == steps[-1] + stats.idle_at_end
+        assert stats.trades <= stats.improving <= stats.draws
+        # Only traders who bought or sold all their units leave
+        units = [0] * len(traders)
+        for t in (*ledger.bidder[offsets[p]:offsets[p+1]], *ledger.seller[offsets[p]:offsets[p+1]]):
+            units[t] += 1
+        assert stats.removals == sum(n == len(trader.redemptions_or_costs) for n, trader in zip(units, traders))
+
+    summary = instrument.summary()
+    assert summary['trades'] == len(ledger)
+    assert summary['reasons'] == {reason: ledger.reasons.count(reason) for reason in ledger.reasons}
+    instrument.write_json(str(tmp_path / 'periods.jsonl'))
+    with open(tmp_path / 'periods.jsonl') as f:
+        assert [json.loads(line)['draws'] for line in f] == [stats.draws for stats in instrument.periods]
+
+
+# Says when periods start and finish
+class Hook:
+    def __init__(self):
+        self.calls = []
+
+    def period_started(self, period):
+        self.calls.append(('started', period))
+
+    def period_finished(self, period, stats):
+        self.calls.append(('finished', period))
+
+
+def test_hooks():
+    hook = Hook()
+    market.market(market.gen_traders(CONFIG), CONFIG, instrument=Instrumentation([hook]))
+    assert hook.calls == [(call, p) for p in range(CONFIG.periods) for call in ('started', 'finished')]
@@ -0,0 +1,58 @@
+import numpy as np
+import modules.market as market
+from modules.config import Config
+from modules.instrument import Instrumentation
+from modules.ledger import TRADE_COLUMNS, LedgerReader, LedgerWriter, MemoryLedger, Trades
+
+CONFIG = Config(num_traders=10, num_commodities=10, periods=4, timeout=0, random_seed=8)
+
+
+def test_writer_and_reader(tmp_path):
+    traders = market.gen_traders(CONFIG)
+    memory = MemoryLedger()
+    # Small chunks so every period gets split over a few flushes
+    writer = LedgerWriter(str(tmp_path), chunk_size=7)
+    prices = market.market(traders, CONFIG, ledgers=(memory, writer))
+
+    reader = LedgerReader(str(tmp_path))
+    assert reader.transaction_prices() == memory.transaction_prices() == prices
+    assert reader.reasons == memory.reasons and len(reader.reasons) == CONFIG.periods
+    assert reader.names == memory.names == [t.name for t in traders]
+    for name in ('period', *TRADE_COLUMNS):
+        assert np.array_equal(reader.columns[name], memory.columns[name])
+    assert (memory.bidder_profit + memory.seller_profit).sum() > 0
+
+
+# Remembers how many periods had run every time it got one
+class Watcher:
+    def __init__(self, instrument):
+        self.instrument = instrument
+        self.seen = []
+
+    def start(self, schedule):
+        pass
+
+    def write_period(self, period, trades, reason):
+        self.seen.append((period, len(self.instrument.periods)))
+
+    def close(self):
+        pass
+
+
+def test_periods_stream_in():
+    instrument = Instrumentation()
+    watcher = Watcher(instrument)
+    market.market(market.gen_traders(CONFIG), CONFIG, ledgers=(watcher,), instrument=instrument)
+    # Every period got written before the next one ran
+    assert watcher.seen == [(p, p + 1) for p in range(CONFIG.periods)]
+
+
+def test_trades():
+    trades = Trades()
+    trades.add(3, 120, 100, 100, 0, 1, 20, 10)
+    trades.add(9, 110, 105, 110, 2, 1, 5, 15)
+    assert len(trades) == 2
+    assert list(trades) == [(3, 120, 100, 100, 0, 1, 20, 10), (9, 110, 105, 110, 2, 1, 5, 15)]
+    assert trades.column('price').tolist() == [100, 110]
+    copy = Trades.from_columns({name: trades.column(name).astype(np.int32) for name in TRADE_COLUMNS})
+    assert list(copy) == list(trades)
@@ -0,0 +1,49 @@
+import modules.market as market
+from modules.book import Schedule, TraderBook
+from modules.config import Config
+from modules.ledger import EXHAUSTED, NO_GAINS, OUT_OF_STEPS, MemoryLedger
+
+# Fig 3 of Gode & Sunder
+FIG3 = Config(costs=(90, 90, 90, 95, 95, 95, 100, 100, 100), redemption_values=(135, 135, 135, 95, 95, 95, 90, 90, 90),
+              timeout=0, random_seed=1)
+
+
+def test_periods_end_when_no_trade_is_left():
+    for constrained in (True, False):
+        ledger = MemoryLedger()
+        market.market(market.gen_traders(FIG3, constrained), FIG3, ledgers=(ledger,))
+        assert all(reason in (EXHAUSTED, NO_GAINS) for reason in ledger.reasons)
+        # Nowhere near the step budget
+        assert ledger.step.max() < FIG3.max_steps // 10
+
+
+def test_trading_over():
+    traders = [market.Trader(bidder=True, redemptions_or_costs=[100, 50]), market.Trader(bidder=False, redemptions_or_costs=[60, 120])]
+    book = TraderBook(Schedule(traders, 1, 200))
+    assert market.trading_over(book) == None
+    book.transact(0, 80)
+    book.transact(1, 80)
+    # 50 for the bidder's next unit against 120 for the seller's
+    assert market.trading_over(book) == NO_GAINS
+    book.transact(0, 50)
+    assert market.trading_over(book) == EXHAUSTED
+
+
+def test_step_budget():
+    config = Config(num_traders=20, num_commodities=20, max_steps=50, timeout=0, random_seed=2)
+    ledger = MemoryLedger()
+    prices = market.market(market.gen_traders(config), config, ledgers=(ledger,))
+    assert ledger.reasons == [OUT_OF_STEPS] * config.periods
+    assert ledger.step.max() <= 50
+    # Same seed and budget, same prices whatever the timeout
+    assert market.market(market.gen_traders(config), config.replace(timeout=10)) == prices
+
+
+def test_same_prices_on_a_pool():
+    config = Config(num_traders=10, num_commodities=10, periods=4, timeout=0, random_seed=5)
+    traders = market.gen_traders(config)
+    prices = market.market(traders, config)
+    for pool in ("process", "thread"):
+        ledger = MemoryLedger()
+        assert market.market(traders, config.replace(workers=3), pool=pool, ledgers=(ledger,)) == prices
+        assert ledger.transaction_prices() == prices
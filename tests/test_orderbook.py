@@ -0,0 +1,70 @@
+import numpy as np
+import modules.market as market
+from modules.book import Schedule, TraderBook
+from modules.config import Config
+from modules.ledger import OUT_OF_STEPS, MemoryLedger
+from modules.orderbook import cda_market
+from modules.rng import Streams
+
+CONFIG = Config(num_traders=10, num_commodities=10, periods=2, timeout=0, random_seed=13)
+
+
+# The continuous double auction the slow way, one order at a time with two
+# random numbers each: a list of resting orders, the best one by price and
+# then by when it came in
+def reference_period(book: TraderBook, rng: np.random.Generator, max_steps: int) -> tuple[list, str]:
+    book.reset()
+    min_price, max_price = book.schedule.min_price, book.schedule.max_price
+    resting = {}
+    trades = []
+    steps = 0
+    reason = market.trading_over(book)
+    while reason == None and steps < max_steps:
+        pick, where = rng.random(2)
+        trader = book.active[int(pick * book.num_active)]
+        steps += 1
+        bidding = book.is_bidder[trader]
+        if not book.constrained[trader]:
+            low, high = min_price, max_price
+        elif bidding:
+            low, high = min_price, book.current_value(trader)
+        else:
+            low, high = book.current_value(trader), max_price
+        offer = low + int(where * (high - low + 1))
+
+        # Quoting again takes the trader's old order out
+        resting.pop(trader, None)
+        # Best order on the other side (lowest ask or highest bid), the oldest first
+        sign = 1 if bidding else -1
+        others = [(sign * price, seq, t) for t, (price, seq, is_bid) in resting.items() if is_bid != bidding]
+        if not others or sign * offer < min(others)[0]:
+            resting[trader] = (offer, steps, bidding)
+            continue
+        price, _, other = min(others)
+        price *= sign
+
+        del resting[other]
+        bidder, seller = (trader, other) if bidding else (other, trader)
+        bid, ask = (offer, price) if bidding else (price, offer)
+        trades.append((steps, bid, ask, price, bidder, seller, book.transact(bidder, price), book.transact(seller, price)))
+        reason = market.trading_over(book)
+    return trades, reason or OUT_OF_STEPS
+
+
+def test_same_as_one_order_at_a_time():
+    for config in (CONFIG, CONFIG.replace(constrained=False), CONFIG.replace(num_traders=40, max_steps=3000), CONFIG.replace(num_traders=2, num_commodities=30)):
+        traders = market.gen_traders(config)
+        ledger = MemoryLedger()
+        cda_market(traders, config, ledgers=(ledger,))
+
+        book = TraderBook(Schedule(traders, config.min_price, config.max_price))
+        streams = Streams(config.seed_entropy)
+        for p, trades, reason in ledger.period_trades():
+            assert (list(trades), reason) == reference_period(book, np.random.default_rng(streams.period(p)), config.max_steps)
+        assert len(ledger) > 0
+
+def test_block_size_doesnt_matter():
+    traders = market.gen_traders(CONFIG)
+    prices = cda_market(traders, CONFIG)
+    for block_size in (1, 7, 100_000):
+        assert cda_market(traders, CONFIG.replace(block_size=block_size)) == prices
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+import modules.analytics as analytics
+import modules.population as population
+from modules.config import Config
+
+
+def test_distributions():
+    for distribution, params in (('uniform', ()), ('step', (('width', 4),)), ('normal', (('mean', 50), ('sd', 80))), ('shifted', (('spread', 30),))):
+        config = Config(num_traders=20, num_commodities=12, min_price=10, max_price=90, distribution=distribution, distribution_params=params, random_seed=14)
+        values = population.population_values(config, sessions=5)
+        assert values.shape == (5, 20, 12) and values.dtype == np.int64
+        assert values.min() >= 10 and values.max() <= 90
+        # Bidders from highest to lowest, sellers the other way around
+        assert (np.diff(values[:, :10], axis=-1) <= 0).all()
+        assert (np.diff(values[:, 10:], axis=-1) >= 0).all()
+        assert np.array_equal(population.population_values(config, sessions=5), values)
+
+
+def test_distribution_params_get_checked():
+    with pytest.raises(ValueError):
+        Config(distribution='normal', distribution_params=(('width', 3),))
+    with pytest.raises(ValueError):
+        Config(distribution='uniform', distribution_params=(('spread', 3),))
+    with pytest.raises(TypeError):
+        Config(distribution='step', distribution_params=(('width', 'three'),))
+
+
+def test_explicit_schedules_get_padded_out_of_reach():
+    config = Config(min_price=10, max_price=90, trader_schedules=((True, (80, 70, 60)), (True, (75,)), (False, (20,)), (False, (30, 40))))
+    values, lengths = population.explicit_values(config)
+    assert values.tolist() == [[80, 70, 60], [75, 9, 9], [20, 91, 91], [30, 40, 91]]
+    assert lengths.tolist() == [3, 1, 1, 2]
+    # Padding never trades
+    demand, supply = analytics.schedules(values, population.roles(config))
+    assert analytics.equilibrium(demand, supply)[0] == 3
+    schedule = population.gen_schedule(config)
+    assert schedule.names == ['b0', 'b1', 's0', 's1']
+    assert list(schedule.lengths) == [3, 1, 1, 2]
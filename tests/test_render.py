@@ -0,0 +1,31 @@
+import os
+import numpy as np
+import modules.render as render
+from modules.config import Config
+from modules.sweep import sweep
+
+CONFIG = Config(num_commodities=5, periods=2, random_seed=11, sweep_seeds=1, sweep_sessions=10, sweep_workers=1,
+                sweep_grid=(('num_traders', (4, 6)),))
+
+
+def test_figures_are_the_sweeps_first_unit(tmp_path, monkeypatch):
+    config = CONFIG.replace(sweep_figures=str(tmp_path))
+    # The jobs instead of the figures
+    monkeypatch.setattr(render, 'render_figures', lambda jobs, workers: jobs)
+    jobs = render.sweep_figures(config, sessions=config.sweep_sessions)
+    assert len(jobs) == 2 * config.sweep_sessions
+
+    # With one seed a row is only that unit
+    for i, row in enumerate(sweep(config)):
+        point = jobs[i*config.sweep_sessions : (i+1)*config.sweep_sessions]
+        assert np.isclose(np.concatenate([job['prices'] for job in point]).mean(), row['price_mean'])
+        assert np.isclose(np.mean([np.diff(job['offsets']) for job in point]), row['trades_mean'])
+        assert point[0]['title'] == f"num_traders={row['num_traders']}"
+
+
+def test_render_figures(tmp_path):
+    for fmt in ('png', 'svg'):
+        config = CONFIG.replace(sweep_figures=str(tmp_path), sweep_figure_format=fmt)
+        paths = render.sweep_figures(config)
+        assert paths == [os.path.join(tmp_path, f"point{i}_session0.{fmt}") for i in range(2)]
+        assert all(os.path.getsize(path) > 0 for path in paths)
@@ -0,0 +1,57 @@
+import numpy as np
+import modules.market as market
+from modules.config import Config
+from modules.rng import Streams, trader_uniforms
+
+
+def draw(draws, t: int, count: int) -> list[float]:
+    numbers = []
+    for _ in range(count):
+        try:
+            numbers.append(next(draws.offers[t]))
+        except StopIteration:
+            numbers.append(draws.more_offers(t))
+    return numbers
+
+
+def picks(draws, count: int) -> list[float]:
+    numbers = []
+    for _ in range(count):
+        try:
+            numbers.append(next(draws.picks))
+        except StopIteration:
+            numbers.append(draws.more_picks())
+    return numbers
+
+
+def test_sessions_are_spawned_children():
+    children = np.random.SeedSequence(15).spawn(3)
+    for b in range(3):
+        assert np.array_equal(Streams(15).session(b).generate_state(4), children[b].generate_state(4))
+
+
+def test_streams_dont_depend_on_blocks_or_each_other():
+    streams = Streams(16)
+    alone = draw(streams.period_draws(2, 5), 3, 300)
+    key = streams.period_draws(2, 5).key
+    assert alone == trader_uniforms(key, 3, np.arange(300)).tolist()
+
+    for block in (1, 7, 4096):
+        draws = streams.period_draws(2, 5, block=block)
+        # Everyone else drawing in between changes nothing
+        together = []
+        for _ in range(30):
+            for t in range(5):
+                numbers = draw(draws, t, 10)
+                if t == 3:
+                    together += numbers
+        assert together == alone
+        assert picks(draws, 100) == np.random.default_rng(streams.period(2)).random(100).tolist()
+
+
+def test_block_size_doesnt_change_markets():
+    config = Config(num_traders=10, num_commodities=10, periods=2, timeout=0, random_seed=17)
+    traders = market.gen_traders(config)
+    prices = market.market(traders, config)
+    for block_size in (1, 13, 100_000):
+        assert market.market(traders, config.replace(block_size=block_size)) == prices
@@ -0,0 +1,12 @@
+import subprocess
+import sys
+from conftest import ROOT
+
+# Everything main.py and sweep.py need when there's nothing to plot
+HEADLESS = ['modules.config', 'modules.market', 'modules.cache', 'modules.ledger', 'modules.batch', 'modules.sweep', 'modules.analytics']
+
+
+def test_no_matplotlib_without_graphs():
+    code = f"import sys\nfor name in {HEADLESS!r}:\n    __import__(name)\nprint('matplotlib' in sys.modules)"
+    out = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True).stdout
+    assert out.strip() == 'False'
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+import modules.sweep as sweep
+from modules.config import Config
+from modules.store import SweepStore, merge, moments
+
+CONFIG = Config(num_commodities=5, periods=2, random_seed=22, sweep_seeds=4, sweep_sessions=10, sweep_workers=1,
+                sweep_grid=(('num_traders', (4, 6)),))
+
+
+def test_moments_merge_exactly():
+    x = np.random.default_rng(23).normal(100, 20, size=1000)
+    merged = merge(merge(moments(x[:10]), moments(x[10:600])), moments(x[600:]))
+    assert merged[0] == 1000
+    assert np.allclose(merged[1:], moments(x)[1:])
+    assert merge((0, 0.0, 0.0), moments(x)) == moments(x)
+
+
+def test_resuming_doesnt_double_count(tmp_path, monkeypatch):
+    store = SweepStore(str(tmp_path / 'sweep.sqlite'))
+    everything = sweep.sweep(CONFIG)
+
+    # Stopped after 3 units
+    run_unit = sweep._run_unit
+    done = []
+    def stops(args):
+        if len(done) == 3:
+            raise KeyboardInterrupt
+        done.append(args)
+        return run_unit(args)
+    monkeypatch.setattr(sweep, '_run_unit', stops)
+    with pytest.raises(KeyboardInterrupt):
+        sweep.sweep(CONFIG, store=store)
+    assert [row['units'] for row in sweep.stored_points(CONFIG, store)] == [3]
+
+    # Picks up where it left off
+    monkeypatch.setattr(sweep, '_run_unit', run_unit)
+    assert sweep.sweep(CONFIG, store=store) == everything
+    # Nothing left to run the second time around
+    monkeypatch.setattr(sweep, '_run_unit', None)
+    assert sweep.sweep(CONFIG, store=store) == everything
+
+    stored = sweep.stored_points(CONFIG, store)
+    assert [(row['units'], row['sessions']) for row in stored] == [(4, 40), (4, 40)]
+    for row, total in zip(stored, everything):
+        for key in ('price_mean', 'price_var', 'efficiency_mean', 'trades_mean', 'trades_var'):
+            assert np.isclose(row[key], total[key])
+    store.close()
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+import modules.market as market
+from modules.book import Schedule, TraderBook
+from modules.config import Config
+from modules.ledger import MemoryLedger
+from modules.rng import Streams
+from modules.strategy import GD, ZIP, Strategy, StrategyMix, ZeroIntelligence
+
+NAMES = ['zip', 'gd', 'zic', 'ziu', 'zip', 'gd', 'zic', 'ziu']
+IS_BIDDER = np.arange(8) < 4
+
+
+def test_strategies_are_abstract():
+    for strategy in (Strategy, ZeroIntelligence):
+        with pytest.raises(TypeError):
+            strategy()
+
+
+def test_one_at_a_time_same_as_arrays():
+    one, arrays = (StrategyMix(NAMES, IS_BIDDER, 1, 1, 200, np.random.default_rng(18)) for _ in range(2))
+    rng = np.random.default_rng(19)
+    session = np.array([0])
+    for _ in range(500):
+        values = rng.integers(50, 150, size=8)
+        alive = rng.random(8) < 0.9
+        u = rng.random(8)
+        offers = [one.by_trader[t].offer(0, t, int(values[t]), float(u[t])) for t in range(8)]
+        assert offers == arrays.offers(np.zeros(8, dtype=np.int64), np.arange(8), values, u).tolist()
+
+        t = int(rng.integers(8))
+        traded = bool(rng.random() < 0.3)
+        trade_price = int(rng.integers(1, 201)) if traded else 0
+        one.observe_one(0, offers[t], bool(IS_BIDDER[t]), traded, trade_price, values, alive)
+        arrays.observe(session, np.array([offers[t]]), IS_BIDDER[t:t+1], np.array([traded]), np.array([trade_price]), values[None], alive[None])
+
+    for a, b in zip(one.strategies, arrays.strategies):
+        if isinstance(a, ZIP):
+            assert np.array_equal(a.margin, b.margin) and np.array_equal(a.momentum, b.momentum)
+        if isinstance(a, GD):
+            assert np.array_equal(a.counts, b.counts)
+
+
+def test_zero_intelligence_through_the_interface():
+    config = Config(num_traders=10, num_commodities=10, timeout=0, random_seed=20, strategies=('zic', 'ziu'))
+    schedule = Schedule(market.gen_traders(config), config.min_price, config.max_price)
+    book = TraderBook(schedule)
+    mix = StrategyMix(schedule.strategies, schedule.is_bidder, 1, config.min_price, config.max_price, np.random.default_rng(0))
+    # Makes run_period() ask the strategies for every offer
+    mix.zero_intelligence = False
+    streams = Streams(config.seed_entropy)
+    for p in range(3):
+        inlined, reason = market.run_period(book, streams.period_draws(p, 10))
+        asked, asked_reason = market.run_period(book, streams.period_draws(p, 10), mix=mix)
+        assert list(asked) == list(inlined) and asked_reason == reason
+        assert len(inlined) > 0
+
+
+def test_constrained_strategies_never_lose():
+    for strategies in (('zip',), ('gd',), ('zic', 'zip', 'gd')):
+        config = Config(num_traders=12, num_commodities=5, periods=3, timeout=0, random_seed=21, strategies=strategies)
+        ledger = MemoryLedger()
+        market.market(market.gen_traders(config), config, ledgers=(ledger,))
+        assert len(ledger) > 0
+        assert (ledger.bidder_profit >= 0).all() and (ledger.seller_profit >= 0).all()
@@ -0,0 +1,21 @@
+import pytest
+from modules.config import Config
+from modules.sweep import grid_points, sweep
+
+CONFIG = Config(num_commodities=5, periods=2, random_seed=7, sweep_seeds=3, sweep_sessions=20,
+                sweep_grid=(('num_traders', (4, 6)), ('constrained', (True, False))))
+
+
+def test_same_rows_for_any_worker_count():
+    rows = sweep(CONFIG.replace(sweep_workers=1))
+    assert [(row['num_traders'], row['constrained'], row['sessions']) for row in rows] == [(4, True, 60), (4, False, 60), (6, True, 60), (6, False, 60)]
+    for workers in (2, 3):
+        assert sweep(CONFIG.replace(sweep_workers=workers)) == rows
+
+
+def test_grid_points():
+    points = grid_points(CONFIG.replace(sweep_grid=(('schedules', ('random',)), ('max_price', (100, 300)))))
+    assert [point for point, _ in points] == [{'schedules': 'random', 'max_price': 100}, {'schedules': 'random', 'max_price': 300}]
+    assert [point_config.max_price for _, point_config in points] == [100, 300]
+    with pytest.raises(ValueError):
+        grid_points(CONFIG.replace(sweep_grid=(('periods', (1, 2)),)))